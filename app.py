@@ -1,8 +1,9 @@
 import flask
 from flask import request
 import json
-from tasks_manager import start_task
+from tasks_manager import start_task, get_task_status, get_all_task_status, TaskValidationError
 from log_manager import get_logger
+from metrics import get_metrics
 
 log = get_logger()
 
@@ -15,16 +16,48 @@ def task_handler():
     :return:
     :Description: This is the entry point of the execution, This function will convert the user request
     to json and send it to task manager to start the execution. If User input is not a valid json then it will
-    return invalid request
+    return invalid request, if a task is invalid i.e an unknown data source or bad augmentation parameters it returns
+    a 400 response with the error and no task is started
     """
     try:
         response = request.data
         response_json = json.loads(response.decode('utf-8'))
         return start_task(response_json)
+    except TaskValidationError as e:
+        return flask.jsonify({"error": str(e)}), 400
     except Exception as e:
         log.error("Failed to parse user request" + str(e))
         return "Invalid Input Please check the input"
 
 
+@app.route('/tasks', methods=['GET'])
+def tasks_status_handler():
+    """
+    :return: progress of all the tasks started by this service
+    """
+    return flask.jsonify(get_all_task_status())
+
+
+@app.route('/tasks/<task_id>', methods=['GET'])
+def task_status_handler(task_id):
+    """
+    :param task_id: id returned by /data_prep
+    :return: images discovered, jobs queued/done/failed, images written/failed, failed augmentations,
+    throughput and ETA of the task
+    """
+    task_status = get_task_status(task_id)
+    if task_status is None:
+        return flask.jsonify({"error": "Unknown task {0}".format(task_id)}), 404
+    return flask.jsonify(task_status)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_handler():
+    """
+    :return: counters and stage timers of the service and its workers in the Prometheus text format
+    """
+    return flask.Response(get_metrics().to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0')
@@ -0,0 +1,88 @@
+"""
+Compares the resize paths of get_image_array for a 1080p to 480x270 downscale. The sample frames are upscaled to
+1920x1080 JPEGs first, then every path decodes and resizes all of them. The old path is a full resolution decode
+followed by a bicubic resize, the other paths use the JPEG draft mode and/or other filters. The mean absolute pixel
+difference to the old path shows the quality cost. The last rows time resize_batch on a NHWC stack.
+
+usage: python benchmarks/bench_resize.py [--source_dir sample_frames] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from resize import open_resized, resize_batch
+
+SOURCE_SIZE = (1920, 1080)
+TARGET_SIZE = (480, 270)
+PATHS = [
+    ('full_decode_bicubic', {"filter": "bicubic", "draft": False}),
+    ('full_decode_bilinear', {"filter": "bilinear", "draft": False}),
+    ('full_decode_bicubic_reducing_gap', {"filter": "bicubic", "draft": False, "reducing_gap": 2.0}),
+    ('draft_bicubic', {"filter": "bicubic", "draft": True}),
+    ('draft_bilinear', {"filter": "bilinear", "draft": True}),
+    ('draft_lanczos', {"filter": "lanczos", "draft": True})
+]
+
+
+def prepare_frames(source_dir, work_dir):
+    """
+    :return: list of the paths of the 1080p JPEG frames
+    """
+    frames = []
+    for file in sorted(os.listdir(source_dir)):
+        if file.endswith(('.jpeg', '.jpg')):
+            frame_path = os.path.join(work_dir, file)
+            Image.open(os.path.join(source_dir, file)).convert('RGB').resize(SOURCE_SIZE, Image.BICUBIC).save(
+                frame_path, quality=95)
+            frames.append(frame_path)
+    return frames
+
+
+def time_path(frames, options, repeat):
+    arrays = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        arrays = [np.asarray(open_resized(frame, TARGET_SIZE, options.get('filter'), options.get('draft', True),
+                                          options.get('reducing_gap'))) for frame in frames]
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / (len(frames) * repeat), arrays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source_dir', default=os.path.join(ROOT, 'sample_frames'))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        frames = prepare_frames(args.source_dir, work_dir)
+        reference = None
+        for name, options in PATHS:
+            latency_ms, arrays = time_path(frames, options, args.repeat)
+            if reference is None:
+                reference = arrays
+            difference = np.mean([np.abs(a.astype(np.int16) - r).mean() for a, r in zip(arrays, reference)])
+            results.append({"path": name, "latency_ms_per_image": round(latency_ms, 3),
+                            "mean_abs_diff_to_full_decode_bicubic": round(float(difference), 3)})
+        stack = np.stack([np.asarray(Image.open(frame).convert('RGB')) for frame in frames[:32]])
+        for resample in ('box', 'bilinear', 'bicubic'):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                resize_batch(stack, TARGET_SIZE, resample)
+            latency_ms = (time.perf_counter() - start) * 1000 / (len(stack) * args.repeat)
+            results.append({"path": "resize_batch_" + resample, "latency_ms_per_image": round(latency_ms, 3)})
+    print(json.dumps({"frames": len(frames), "source_size": SOURCE_SIZE, "target_size": TARGET_SIZE,
+                      "results": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures the cold start cost of a worker process: every module is imported in a fresh interpreter, which is what
+a spawned worker process pays, and the import time and the resident memory after the import are reported. The
+tensorflow.keras image module the worker used to import is measured too when TensorFlow is installed, so the
+before and after numbers come from the same machine.
+
+usage: python benchmarks/bench_startup.py [--repeat 5] [--output results.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+MODULES = [
+    ('baseline', None),
+    ('numpy_pil', 'import numpy, PIL.Image'),
+    ('worker', 'import worker'),
+    ('job_queue', 'import job_queue'),
+    ('tensorflow_keras_image', 'from tensorflow.keras.preprocessing import image'),
+    ('worker_tensorflow_backend', 'import worker; worker.get_image_io()')
+]
+
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({{"import_sec": elapsed, "rss_mb": rss_kb / 1024,
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+'''
+
+
+def probe(name, statement):
+    """
+    :param name: name of the measure, the tensorflow backend one selects the backend through the environment
+    :param statement: import statement run in the fresh interpreter
+    :return: dictionary of the import time and the memory, None if the import failed
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    if name == 'worker_tensorflow_backend':
+        env['IMAGE_AUGMENTATION_IO_BACKEND'] = 'tensorflow'
+    result = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement or 'pass')], cwd=ROOT, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "modules": []}
+    for name, statement in MODULES:
+        runs = [probe(name, statement) for _ in range(args.repeat)]
+        runs = [run for run in runs if run]
+        if not runs:
+            report["modules"].append({"name": name, "skipped": "import failed, module not installed"})
+            continue
+        import_times = sorted(run["import_sec"] for run in runs)
+        report["modules"].append({
+            "name": name,
+            "import_ms_median": round(import_times[len(import_times) // 2] * 1000, 1),
+            "rss_mb": round(max(run["rss_mb"] for run in runs), 1),
+            "max_rss_mb": round(max(run["max_rss_mb"] for run in runs), 1)
+        })
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
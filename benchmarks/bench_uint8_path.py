@@ -0,0 +1,108 @@
+"""
+Compares the old float32 image path (img_to_array and keras save_img) with the uint8 path of the worker on the
+sample_frames workload: decode, resize, crop the central 270x270 region and save it. The decoded frames are kept in
+memory like the decode cache does, every mode runs in its own process so their peak RSS don't mix. The float32
+mode uses keras when TensorFlow is installed, otherwise the same steps are replayed with PIL and a float32 array
+saved through image_io, which rescales it like keras save_img.
+
+usage: python benchmarks/bench_uint8_path.py [--source_dir sample_frames] [--input_image_size 480 270]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def get_float32_path(input_image_size):
+    """
+    :param input_image_size: size the frames are resized to
+    :return: load and save functions of the old float32 path and the name of the library used
+    """
+    import numpy as np
+    try:
+        from tensorflow.keras.preprocessing import image
+    except ImportError:
+        from PIL import Image
+        from image_io import get_image_io
+
+        def load_float32(path):
+            return np.asarray(Image.open(path).convert('RGB').resize(tuple(input_image_size)), dtype=np.float32)
+
+        def save_float32(path, image_array):
+            get_image_io().save_image(image_array, path)
+        return load_float32, save_float32, 'numpy'
+
+    def load_float32(path):
+        return image.img_to_array(image.load_img(path).resize(tuple(input_image_size)))
+
+    def save_float32(path, image_array):
+        image.save_img(path, image_array)
+    return load_float32, save_float32, 'keras'
+
+
+def run_mode(mode, source_dir, input_image_size):
+    """
+    :param mode: float32 or uint8
+    :param source_dir: directory of the frames
+    :param input_image_size: size the frames are resized to
+    :return: dictionary of the latency and peak RSS of the mode
+    """
+    import numpy as np
+    import worker
+    float32_backend = None
+    if mode == 'float32':
+        load_float32, save_float32, float32_backend = get_float32_path(input_image_size)
+    files = sorted(os.path.join(source_dir, f) for f in os.listdir(source_dir) if f.endswith(('.jpeg', '.jpg')))
+    decoded = []
+    latencies = []
+    with tempfile.TemporaryDirectory() as target_dir:
+        for i, path in enumerate(files):
+            start = time.perf_counter()
+            if mode == 'float32':
+                image_array = load_float32(path)
+                save_float32(os.path.join(target_dir, '{0}.jpeg'.format(i)), image_array[0:270, 0:270, :])
+            else:
+                image_array = worker.get_image_array(path, input_image_size)
+                worker.write_image_file(image_array[0:270, 0:270, :], os.path.join(target_dir, '{0}.jpeg'.format(i)))
+            latencies.append(time.perf_counter() - start)
+            decoded.append(image_array)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "mode": mode,
+        "float32_backend": float32_backend,
+        "images": len(files),
+        "decoded_bytes": int(sum(a.nbytes for a in decoded)),
+        "latency_ms_mean": round(float(latencies_ms.mean()), 3),
+        "latency_ms_p50": round(float(np.percentile(latencies_ms, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(latencies_ms, 95)), 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source_dir', default=os.path.join(ROOT, 'sample_frames'))
+    parser.add_argument('--input_image_size', nargs=2, type=int, default=[480, 270])
+    parser.add_argument('--mode', choices=['float32', 'uint8'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.source_dir, args.input_image_size)))
+        return
+    results = []
+    for mode in ('float32', 'uint8'):
+        output = subprocess.run([sys.executable, __file__, '--mode', mode, '--source_dir', args.source_dir,
+                                 '--input_image_size'] + [str(s) for s in args.input_image_size],
+                                check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
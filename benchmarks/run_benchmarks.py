@@ -0,0 +1,259 @@
+"""
+Benchmark suite of the augmentation pipeline on the sample_frames workload. Every stage is timed per image:
+get_image_array, image_cropping, image_random_cropping, save_image_to_train_test and a full handle_task run through
+the worker pool. The report has the images/sec, the latency percentiles and the peak resident memory per stage, of
+this process and of the worker pool processes, it is printed as json and can be written to a file to compare later
+runs against it.
+
+usage: python benchmarks/run_benchmarks.py [--output results.json] [--baseline old_results.json]
+                                           [--profile_dir profiles/] [--trace_memory]
+"""
+import argparse
+import cProfile
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+STAGES = ['get_image_array', 'image_cropping', 'image_random_cropping', 'save_image_to_train_test', 'handle_task']
+REGRESSION_THRESHOLD = 0.1
+
+
+def read_peak_rss_kb(pid):
+    """
+    :param pid: process id
+    :return: peak resident set size of the process in KB since it started or since reset_peak_rss, None where
+    /proc isn't available
+    """
+    try:
+        with open('/proc/{0}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def reset_peak_rss(pid):
+    """
+    :description: Start the peak resident set size of the process again from its current size, Linux only
+    """
+    try:
+        with open('/proc/{0}/clear_refs'.format(pid), 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def memory_report():
+    """
+    :return: peak resident memory of this process and the sum of the peaks of its live child processes, i.e the
+    worker pool, since the last reset_peak_rss
+    """
+    peak_rss_kb = read_peak_rss_kb(os.getpid())
+    if peak_rss_kb is None:
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_peaks = [read_peak_rss_kb(child.pid) for child in multiprocessing.active_children()]
+    children_peaks = [peak for peak in children_peaks if peak is not None]
+    return {
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+        "workers_peak_rss_mb": round(sum(children_peaks) / 1024, 1) if children_peaks else None
+    }
+
+
+def percentile_report(latencies, images):
+    """
+    :param latencies: list of the latency in seconds of every call
+    :param images: number of images produced by the calls
+    :return: dictionary of the throughput and latency percentiles in milliseconds
+    """
+    import numpy as np
+    latencies_ms = np.array(latencies) * 1000
+    total = sum(latencies)
+    return {
+        "calls": len(latencies),
+        "images": images,
+        "images_per_sec": round(images / total, 3) if total else None,
+        "latency_ms_p50": round(float(np.percentile(latencies_ms, 50)), 3),
+        "latency_ms_p90": round(float(np.percentile(latencies_ms, 90)), 3),
+        "latency_ms_p99": round(float(np.percentile(latencies_ms, 99)), 3),
+        "latency_ms_max": round(float(latencies_ms.max()), 3)
+    }
+
+
+class StageRunner:
+    """
+    Runs the stages on the frames of the source directory, optionally under cProfile and tracemalloc
+    """
+    def __init__(self, source_dir, work_dir, input_image_size, repeat, profile_dir=None, trace_memory=False):
+        self.source_dir = source_dir
+        self.work_dir = work_dir
+        self.input_image_size = input_image_size
+        self.repeat = repeat
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.files = sorted(os.path.join(source_dir, f) for f in os.listdir(source_dir)
+                            if f.endswith(('.jpeg', '.jpg', '.png')))
+
+    def run(self, stage):
+        """
+        :param stage: name of the stage
+        :return: report of the stage
+        """
+        profiler = cProfile.Profile() if self.profile_dir else None
+        for pid in [os.getpid()] + [child.pid for child in multiprocessing.active_children()]:
+            reset_peak_rss(pid)
+        if self.trace_memory:
+            tracemalloc.start()
+        if profiler:
+            profiler.enable()
+        latencies, images = getattr(self, 'bench_' + stage)()
+        if profiler:
+            profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.profile_dir, stage + '.prof'))
+        report = percentile_report(latencies, images)
+        report.update(memory_report())
+        if self.trace_memory:
+            report['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 3)
+            tracemalloc.stop()
+        return report
+
+    def decoded_images(self):
+        from worker import get_image_array
+        return [get_image_array(path, self.input_image_size) for path in self.files]
+
+    def timed(self, function, items):
+        latencies = []
+        images = 0
+        for _ in range(self.repeat):
+            for item in items:
+                start = time.perf_counter()
+                images += function(item)
+                latencies.append(time.perf_counter() - start)
+        return latencies, images
+
+    def bench_get_image_array(self):
+        from worker import get_image_array
+        return self.timed(lambda path: get_image_array(path, self.input_image_size) is not None, self.files)
+
+    def bench_image_cropping(self):
+        from modules.crop import image_cropping
+        return self.timed(lambda img: len(list(image_cropping(img, [[270, 270]], 'left_down_center'))),
+                          self.decoded_images())
+
+    def bench_image_random_cropping(self):
+        from modules.random_crop import image_random_cropping
+        return self.timed(lambda img: len(list(image_random_cropping(img, [80, 80], 3))), self.decoded_images())
+
+    def bench_save_image_to_train_test(self):
+        from worker import save_image_to_train_test
+        target_dir = os.path.join(self.work_dir, 'save_image_to_train_test')
+        crops = [(str(i) + '.jpeg', img[0:270, 0:270, :]) for i, img in enumerate(self.decoded_images())]
+        split_ratio = {"train_ratio": 80, "test_ratio": 20}
+        return self.timed(lambda crop: int(save_image_to_train_test(crop[1], target_dir, crop[0], split_ratio)),
+                          crops)
+
+    def bench_handle_task(self):
+        import tasks_manager
+        latencies = []
+        images = 0
+        for i in range(self.repeat):
+            start = time.perf_counter()
+            tasks_manager.handle_task('BENCHMARK', [{"CROP": {"crop_dimensions": [[270, 270]],
+                                                              "crop_type": "left_down_center"},
+                                                     "RANDOM_CROP": {"crop_dimensions": [80, 80], "target_count": 3}}],
+                                      {"train_ratio": 80, "test_ratio": 20}, self.input_image_size,
+                                      task_id='benchmark-{0}'.format(i))
+            latencies.append(time.perf_counter() - start)
+            images += tasks_manager.get_task_status('benchmark-{0}'.format(i))['images_written']
+        return latencies, images
+
+
+def prepare_config_dir(source_dir, work_dir):
+    """
+    :description: Copy the config directory and add a BENCHMARK data source which writes into the work directory
+    :return: path of the benchmark config directory
+    """
+    config_dir = os.path.join(work_dir, 'config')
+    shutil.copytree(os.path.join(ROOT, 'config'), config_dir)
+    with open(os.path.join(config_dir, 'data_sources.json'), 'w') as f:
+        json.dump([{"name": "BENCHMARK", "image_type": ["jpg", "jpeg", "png"], "source_dir": [source_dir],
+                    "target_dir": os.path.join(work_dir, 'handle_task')}], f)
+    return config_dir
+
+
+def compare(results, baseline):
+    """
+    :return: list of the stages whose throughput dropped more than the threshold against the baseline
+    """
+    regressions = []
+    for stage, report in results['stages'].items():
+        old_report = baseline.get('stages', {}).get(stage)
+        if not old_report or not old_report.get('images_per_sec') or not report.get('images_per_sec'):
+            continue
+        change = report['images_per_sec'] / old_report['images_per_sec'] - 1
+        report['images_per_sec_change'] = round(change, 3)
+        if change < -REGRESSION_THRESHOLD:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source_dir', default=os.path.join(ROOT, 'sample_frames'))
+    parser.add_argument('--input_image_size', nargs=2, type=int, default=[480, 270])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=1, help='number of passes over the frames per stage')
+    parser.add_argument('--output', help='write the results as json to this file')
+    parser.add_argument('--baseline', help='results of a previous run to compare with')
+    parser.add_argument('--profile_dir', help='dump a cProfile file per stage into this directory')
+    parser.add_argument('--trace_memory', action='store_true', help='report the tracemalloc peak per stage')
+    args = parser.parse_args()
+
+    source_dir = os.path.abspath(args.source_dir)
+    work_dir = tempfile.mkdtemp(prefix='augmentation_benchmark_')
+    os.environ['IMAGE_AUGMENTATION_CONFIG_DIR'] = prepare_config_dir(source_dir, work_dir)
+    runner = StageRunner(source_dir, work_dir, args.input_image_size, args.repeat, args.profile_dir,
+                         args.trace_memory)
+    results = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "frames": len(runner.files),
+        "stages": {}
+    }
+    try:
+        for stage in args.stages:
+            results['stages'][stage] = runner.run(stage)
+    finally:
+        if 'tasks_manager' in sys.modules:
+            sys.modules['tasks_manager'].get_worker_pool().shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    results['workers_peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        results['regressions'] = regressions
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,99 @@
 import json
 import os
+import threading
+from types import MappingProxyType
 from log_manager import get_logger
 
 ROOT = os.path.dirname(os.path.realpath(__file__))
-CONFIG_DIR = 'config'
+CONFIG_DIR = os.environ.get('IMAGE_AUGMENTATION_CONFIG_DIR', 'config')
 
 logger = get_logger()
 
 
+def freeze(value):
+    """
+    :param value: parsed json value
+    :return: read only copy of the value, dictionaries become mapping proxies and lists become tuples
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class ConfigRegistry:
+    """
+    In memory registry of a json config file, the file is parsed once and parsed again only when its mtime
+    changes. Entries are read only and, for a list of named entries, indexed by name.
+    """
+    def __init__(self, file_name):
+        self.source_path = os.path.join(ROOT, CONFIG_DIR, file_name)
+        self._mtime = None
+        self._config = None
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.source_path).st_mtime_ns
+        except FileNotFoundError:
+            if self._mtime is not False:
+                logger.error(f"ERROR: {self.source_path} FILE NOT FOUND")
+                self._mtime, self._config, self._index = False, None, {}
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.source_path) as f:
+                config = freeze(json.load(f))
+        except Exception as e:
+            logger.error(f"ERROR: Failed to load the configuration:{self.source_path}.Exception:{str(e)}")
+            return
+        self._config = config
+        self._index = {}
+        if isinstance(config, tuple):
+            self._index = {entry['name']: entry for entry in config if 'name' in entry}
+        self._mtime = mtime
+        logger.info(f"Loaded configuration {self.source_path}")
+
+    def get(self, default=None):
+        """
+        :param default: returned if the config can't be loaded
+        :return: the whole config
+        """
+        with self._lock:
+            self._reload_if_changed()
+            return self._config if self._config is not None else default
+
+    def get_entry(self, name):
+        """
+        :param name: value of the name field of the entry
+        :return: the entry with the given name, empty mapping if not found
+        """
+        with self._lock:
+            self._reload_if_changed()
+            return self._index.get(name, MappingProxyType({}))
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(file_name):
+    """
+    :param file_name: name of the json file in the config directory
+    :return: the registry of the file, shared by every ConfigurationManager of the process
+    """
+    with _registries_lock:
+        if file_name not in _registries:
+            _registries[file_name] = ConfigRegistry(file_name)
+        return _registries[file_name]
+
+
 class ConfigurationManager:
     """
-    This class is to manage the configuration and deliver the configs as needed
+    This class is to manage the configuration and deliver the configs as needed, the configs are read only
     """
     def __init__(self, env):
         self.env = env
@@ -20,51 +103,34 @@ class ConfigurationManager:
         :return: Returns all the data sources config
         """
         if self.env == 'dev':
-            data_sources = {}
-            source_path = os.path.join(ROOT, CONFIG_DIR, 'data_sources.json')
-            try:
-                with open(source_path) as f:
-                    data_sources = json.load(f)
-            except FileNotFoundError:
-                logger.error(f"ERROR: {source_path} FILE NOT FOUND")
-            except Exception as e:
-                logger.error(f"ERROR: Failed to load the data source configuration:{source_path}.Exception:{str(e)}")
-            return data_sources
+            return get_registry('data_sources.json').get(())
 
     def get_data_source(self, name):
         """
         :param name: Name of the particular data source i.e MotoGp
         :return: the dictionary of the data source config
         """
-        data_sources = self.get_data_sources()
-        for data_source in data_sources:
-            if name == data_source['name']:
-                return data_source
-        return {}
+        if self.env == 'dev':
+            return get_registry('data_sources.json').get_entry(name)
 
     def get_all_aug_parameters(self):
         """
         :return: all the augmentation config present in augmentations.json
         """
         if self.env == 'dev':
-            aug_parameters = {}
-            source_path = os.path.join(ROOT, CONFIG_DIR, 'augmentation.json')
-            try:
-                with open(source_path) as f:
-                    aug_parameters = json.load(f)
-            except FileNotFoundError:
-                logger.error(f"ERROR: {source_path} FILE NOT FOUND")
-            except Exception as e:
-                logger.error(f"ERROR: Failed to load the data source configuration:{source_path}.Exception:{str(e)}")
-            return aug_parameters
+            return get_registry('augmentation.json').get(())
 
     def get_aug_parameters(self, name):
         """
         :param name: name of the augmentation i.e crop, random_crop
         :return: dictionary of the augmentation parameter
         """
-        all_aug_details = self.get_all_aug_parameters()
-        for aug_detail in all_aug_details:
-            if name == aug_detail['name']:
-                return aug_detail
-        return {}
+        if self.env == 'dev':
+            return get_registry('augmentation.json').get_entry(name)
+
+    def get_worker_pool_config(self):
+        """
+        :return: worker pool config i.e backend, number of worker processes and size of the job queue
+        """
+        if self.env == 'dev':
+            return get_registry('worker_pool.json').get(MappingProxyType({}))
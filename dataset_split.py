@@ -0,0 +1,56 @@
+from log_manager import get_logger
+import hashlib
+
+logger = get_logger()
+
+TRAIN = 'train'
+TEST = 'test'
+VALIDATION = 'validation'
+HASH_RANGE = float(1 << 64)
+
+
+def get_split_ratios(split_ratio):
+    """
+    :param split_ratio: Dictionary of train test split ratio in percent i.e {"train_ratio": 80, "test_ratio": 20},
+    the test ratio defaults to the rest of the train ratio and the validation ratio to whatever is left
+    :return: tuple of train, test and validation ratio in percent
+    """
+    train_ratio = split_ratio.get('train_ratio') or 0
+    test_ratio = split_ratio.get('test_ratio', 100 - train_ratio)
+    validation_ratio = split_ratio.get('validation_ratio', 100 - train_ratio - test_ratio)
+    if min(train_ratio, test_ratio, validation_ratio) < 0 or train_ratio + test_ratio + validation_ratio > 100:
+        raise ValueError("Invalid train test split ratio {0}".format(dict(split_ratio)))
+    return train_ratio, test_ratio, validation_ratio
+
+
+def assign_split(split_key, split_ratio):
+    """
+    :description: Deterministic split of one source frame, the hash of the key is mapped on [0, 100) and compared
+    with the cumulative ratios. The same frame always lands in the same split, on every worker and every run.
+    :param split_key: stable name of the source frame i.e its file name
+    :param split_ratio: Dictionary of train test split ratio, an optional seed reshuffles the assignment
+    :return: train, test or validation, None if the data set is not split
+    """
+    if not split_ratio or not split_ratio.get('train_ratio'):
+        return None
+    return split_by_ratios(split_key, get_split_ratios(split_ratio), split_ratio.get('seed', ''))
+
+
+def split_by_ratios(split_key, ratios, seed=''):
+    """
+    :description: Hash based assignment of assign_split, without the shortcut for a data set which isn't split, a
+    zero train ratio sends every frame to the test or validation set
+    :param split_key: stable name of the source frame i.e its file name
+    :param ratios: tuple of train, test and validation ratio in percent, see get_split_ratios
+    :param seed: optional seed which reshuffles the assignment
+    :return: train, test or validation
+    """
+    train_ratio, test_ratio, validation_ratio = ratios
+    digest = hashlib.blake2b((str(seed) + '/' + split_key).encode('utf-8'), digest_size=8).digest()
+    position = int.from_bytes(digest, 'big') / HASH_RANGE * (train_ratio + test_ratio + validation_ratio)
+    if position < train_ratio:
+        return TRAIN
+    if position < train_ratio + test_ratio or not validation_ratio:
+        return TEST
+    return VALIDATION
+
@@ -0,0 +1,134 @@
+from log_manager import get_logger
+from resize import open_resized
+from PIL import Image
+import numpy as np
+import threading
+import os
+
+logger = get_logger()
+
+IMAGE_IO_BACKEND_ENV = 'IMAGE_AUGMENTATION_IO_BACKEND'
+DEFAULT_BACKEND = 'pil'
+
+
+def scale_to_uint8(img):
+    """
+    :description: Rescaling of a non uint8 array to 0-255, the same one keras save_img applies: negative values
+    are shifted to 0 and the array is divided by its maximum
+    :param img: image array of any numeric dtype
+    :return: HxWxC uint8 image array
+    """
+    img = np.asarray(img, dtype=np.float32)
+    img = img + max(-float(img.min()), 0)
+    max_value = img.max()
+    if max_value:
+        img = img / max_value
+    return (img * 255).astype(np.uint8)
+
+
+class PilImageIO:
+    """
+    Decodes and encodes the images with PIL and NumPy only, importing it costs a few milliseconds and keeps the
+    worker processes small.
+    """
+    name = 'pil'
+
+    def load_image(self, path, input_image_size=None, resize=None):
+        """
+        :param path: jpeg, png or any other image input path
+        :param input_image_size: (width, height) the image is resized to, the original size if None
+        :param resize: optional resize options i.e {"filter": "bilinear", "draft": true, "reducing_gap": 2.0}
+        :return: HxWxC uint8 image array
+        """
+        resize = resize or {}
+        img = open_resized(path, input_image_size, resize.get('filter'), resize.get('draft', True),
+                           resize.get('reducing_gap'))
+        return np.asarray(img, dtype=np.uint8)
+
+    def save_image(self, img, path):
+        """
+        :param img: image array, other dtypes than uint8 are rescaled to 0-255
+        :param path: absolute path of the target file, the extension gives the encoding
+        """
+        if img.dtype != np.uint8:
+            img = scale_to_uint8(img)
+        Image.fromarray(img.squeeze(-1) if img.ndim == 3 and img.shape[-1] == 1 else img).save(path)
+
+
+class TensorflowImageIO:
+    """
+    Decodes, resizes and encodes the images with the TensorFlow ops. TensorFlow is only imported when this backend
+    is selected, the resampling filters are mapped on the tf.image resize methods.
+    """
+    name = 'tensorflow'
+    RESIZE_METHODS = {
+        'nearest': 'nearest',
+        'box': 'area',
+        'bilinear': 'bilinear',
+        'bicubic': 'bicubic',
+        'lanczos': 'lanczos3'
+    }
+
+    def __init__(self):
+        import tensorflow as tf
+        self._tf = tf
+
+    def load_image(self, path, input_image_size=None, resize=None):
+        """
+        :param path: jpeg, png, gif or bmp input path
+        :param input_image_size: (width, height) the image is resized to, the original size if None
+        :param resize: optional resize options, only the filter is used
+        :return: HxWxC uint8 image array
+        """
+        tf = self._tf
+        img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        if input_image_size:
+            width, height = input_image_size
+            if tuple(img.shape[:2]) != (height, width):
+                method = self.RESIZE_METHODS.get(((resize or {}).get('filter') or 'bicubic').lower())
+                if method is None:
+                    raise ValueError("Resampling filter must be one of {0}".format(', '.join(self.RESIZE_METHODS)))
+                img = tf.image.resize(img, (height, width), method=method, antialias=True)
+                img = tf.cast(tf.clip_by_value(tf.round(img), 0, 255), tf.uint8)
+        return img.numpy()
+
+    def save_image(self, img, path):
+        """
+        :param img: image array, other dtypes than uint8 are rescaled to 0-255
+        :param path: absolute path of the target file, png for a .png extension and jpeg otherwise
+        """
+        tf = self._tf
+        if img.dtype != np.uint8:
+            img = scale_to_uint8(img)
+        if path.lower().endswith('.png'):
+            encoded = tf.io.encode_png(img)
+        else:
+            encoded = tf.io.encode_jpeg(img)
+        tf.io.write_file(path, encoded)
+
+
+IMAGE_IO_BACKENDS = {
+    'pil': PilImageIO,
+    'tensorflow': TensorflowImageIO
+}
+
+_image_io = None
+_image_io_lock = threading.Lock()
+
+
+def get_image_io():
+    """
+    :description: Image I/O backend of this process, selected by the IMAGE_AUGMENTATION_IO_BACKEND environment
+    variable (pil or tensorflow), PIL by default. The backend is created on first use so TensorFlow is never
+    imported by a worker which doesn't use it.
+    :return: image I/O backend with load_image and save_image
+    """
+    global _image_io
+    with _image_io_lock:
+        if _image_io is None:
+            backend = os.environ.get(IMAGE_IO_BACKEND_ENV, DEFAULT_BACKEND).lower()
+            if backend not in IMAGE_IO_BACKENDS:
+                logger.error("Unknown image I/O backend {0}".format(backend))
+                raise ValueError("Image I/O backend must be one of {0}".format(', '.join(IMAGE_IO_BACKENDS)))
+            _image_io = IMAGE_IO_BACKENDS[backend]()
+        return _image_io
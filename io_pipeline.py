@@ -0,0 +1,79 @@
+from log_manager import get_logger
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import queue
+
+logger = get_logger()
+
+_END = object()
+
+
+def prefetch(source, load_function, depth=4, threads=2):
+    """
+    :description: Read ahead stage of the pipeline. A feeder thread pulls the items from the source and loads them
+    on a thread pool while the caller is busy with the previous items, at most depth items are loaded ahead.
+    :param source: iterable of items i.e job tickets
+    :param load_function: function which loads an item i.e decodes the image of a job ticket
+    :param depth: number of items loaded ahead of the caller
+    :param threads: number of loader threads, 0 loads the items in the caller's thread
+    :return: Generator of the item and the loaded value in the order of the source
+    """
+    if not threads:
+        for item in source:
+            yield item, load_function(item)
+        return
+    pending = queue.Queue(maxsize=max(depth, 1))
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='prefetch')
+
+    def feed():
+        try:
+            for item in source:
+                pending.put((item, executor.submit(load_function, item)))
+        except Exception as e:
+            logger.error("Failed to read the next item to prefetch")
+            logger.error(str(e))
+        finally:
+            pending.put(_END)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        while True:
+            entry = pending.get()
+            if entry is _END:
+                break
+            item, future = entry
+            yield item, future.result()
+    finally:
+        executor.shutdown(wait=False)
+
+
+class AsyncImageWriter:
+    """
+    Write stage of the pipeline, encodes and saves the images on a pool of writer threads. The number of pending
+    writes is bounded so the augmentation blocks instead of piling up image arrays when the disk falls behind.
+    """
+    def __init__(self, threads=2, queue_size=64):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='writer')
+        self._slots = threading.BoundedSemaphore(queue_size)
+
+    def submit(self, save_function, *args):
+        """
+        :param save_function: function which saves the image i.e save_image_to_train_test
+        :param args: arguments of the save function
+        :return: future of the save function's result
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(save_function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        """
+        :description: Wait for the pending writes and stop the writer threads
+        """
+        self._executor.shutdown(wait=True)
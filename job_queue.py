@@ -0,0 +1,800 @@
+from log_manager import get_logger, get_log_queue, configure_worker_logging
+from metrics import get_metrics
+from worker import execute_job, load_job_image, set_decode_cache_size, CorruptImageError
+from io_pipeline import prefetch, AsyncImageWriter
+from shard_writer import flush_shard_writers, close_shard_writers, ShardReceipt
+from collections.abc import Mapping
+import multiprocessing
+import itertools
+import sqlite3
+import queue
+import threading
+import json
+import time
+import uuid
+import os
+
+logger = get_logger()
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_QUEUE_PATH = 'destination/.job_queue.sqlite3'
+DEFAULT_VISIBILITY_TIMEOUT_SEC = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY_SEC = 5
+DEFAULT_JOURNAL_MODE = 'DELETE'
+JOURNAL_MODES = ('DELETE', 'WAL')
+POLL_INTERVAL_SEC = 0.1
+WORKER_CHECK_INTERVAL_SEC = 1.0
+LEASE_NOTICE = 'leased'
+IDLE = object()
+
+
+class LocalJobQueue:
+    """
+    Job queue backed by multiprocessing queues, job tickets flow from the task manager to the worker processes and
+    job reports flow back. The ticket queue is bounded so the producer blocks when the workers fall behind. A worker
+    sends a lease notice along the reports when it takes a ticket, so the jobs held by a worker process which died
+    can be recovered by the task manager.
+    """
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+        self._tickets = multiprocessing.Queue(maxsize=queue_size)
+        self._reports = multiprocessing.Queue()
+        self._job_ids = itertools.count(1)
+        self._pending = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'_tickets': self._tickets, '_reports': self._reports}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def put(self, job_ticket, timeout=None):
+        """
+        :param job_ticket: job ticket to enqueue, blocks while the queue is full
+        :param timeout: seconds to wait for a free slot, None waits forever
+        """
+        with self._lock:
+            job_ticket['job_id'] = next(self._job_ids)
+            self._pending[job_ticket['job_id']] = {key: job_ticket.get(key) for key in
+                                                   ('task_id', 'file', 'content_hash', 'params_hash')}
+        self._tickets.put(job_ticket, timeout=timeout)
+
+    def get(self, timeout=None):
+        """
+        :param timeout: seconds to wait for a ticket, None waits forever
+        :return: next job ticket or None when the worker has to stop
+        """
+        job_ticket = self._tickets.get(timeout=timeout)
+        if job_ticket is not None:
+            self._reports.put((LEASE_NOTICE, job_ticket['job_id'], os.getpid()))
+        return job_ticket
+
+    def task_done(self, job_ticket, report):
+        """
+        :param job_ticket: the job ticket which is processed
+        :param report: dictionary with the outcome of the job
+        """
+        self._reports.put(dict(report, job_id=job_ticket.get('job_id')))
+
+    def get_report(self, timeout=None):
+        """
+        :description: The lease notices are recorded and skipped, the report of a job which was already recovered
+        is ignored
+        :return: next job report or None when the report collector has to stop
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            report = self._reports.get(timeout=None if deadline is None else max(deadline - time.time(), 0))
+            if isinstance(report, tuple) and report[0] == LEASE_NOTICE:
+                with self._lock:
+                    if report[1] in self._pending:
+                        self._leases[report[1]] = report[2]
+                continue
+            if report is None:
+                return None
+            with self._lock:
+                self._leases.pop(report.get('job_id'), None)
+                if self._pending.pop(report.get('job_id'), None) is None:
+                    logger.error("Ignored the report of the recovered job {0}".format(report.get('job_id')))
+                    continue
+            return report
+
+    def recover_jobs(self, pid):
+        """
+        :description: Fail the jobs leased by a worker process which died, they may have crashed it
+        :param pid: process id of the dead worker
+        :return: list of the failure reports of its jobs
+        """
+        reports = []
+        with self._lock:
+            for job_id in [job_id for job_id, worker_pid in self._leases.items() if worker_pid == pid]:
+                del self._leases[job_id]
+                job = self._pending.pop(job_id)
+                logger.error("Failed the job of {0}, its worker process {1} died".format(job['file'], pid))
+                reports.append({"task_id": job['task_id'], "job_id": job_id, "status": "failed",
+                                "error": "Worker process {0} died".format(pid), "images_written": 0,
+                                "content_hash": job['content_hash'], "params_hash": job['params_hash']})
+        return reports
+
+    def stop_workers(self, num_workers):
+        """
+        :description: Put one stop marker per worker behind the pending tickets so the workers drain the queue first
+        """
+        for _ in range(num_workers):
+            self._tickets.put(None)
+
+    def stop_reports(self):
+        self._reports.put(None)
+
+
+def _json_default(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    return list(value)
+
+
+class SqliteJobQueue:
+    """
+    Job queue stored in a SQLite file, every process or host which opens the same file shares the queue, so
+    standalone workers on other machines of the shared dataset storage can take part in a task. A worker leases a
+    ticket for visibility_timeout_sec, a ticket whose lease expires (the worker died or hangs) is handed out again.
+    A failed job is retried max_attempts times with a growing delay, a corrupt frame or a job which keeps failing
+    is dead-lettered: it stays in the jobs table with the status dead and its failure is reported. A ticket carries
+    the stop group of the queue which put it, its reports are written to a table under that stop group and only
+    the collector of that worker pool reads them, so several pools can share the same file.
+
+    Across hosts the queue relies on the POSIX advisory locks (fcntl) of the shared file system, the rollback
+    journal (journal_mode DELETE) is used by default since WAL mode keeps its index in shared memory which other
+    hosts don't see. On NFS the storage has to be mounted with working locks, NFSv4 or NFSv3 with the lock manager
+    running, never with the nolock or local_lock options, and the hosts must not cache the file attributes longer
+    than the lock round trip (the default close-to-open consistency is enough since SQLite takes a lock on every
+    transaction). File systems without fcntl locks, i.e most FUSE and SMB mounts, corrupt the queue. WAL mode is
+    faster and can be used when the task manager and all its workers run on the same host.
+    """
+    def __init__(self, path=DEFAULT_QUEUE_PATH, queue_size=DEFAULT_QUEUE_SIZE,
+                 visibility_timeout_sec=DEFAULT_VISIBILITY_TIMEOUT_SEC, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 retry_delay_sec=DEFAULT_RETRY_DELAY_SEC, stop_group=None, journal_mode=DEFAULT_JOURNAL_MODE):
+        """
+        :param path: path of the SQLite file, on the shared storage to distribute the jobs across hosts
+        :param queue_size: number of queued or leased tickets before submitting blocks
+        :param visibility_timeout_sec: seconds a leased ticket stays invisible to the other workers
+        :param max_attempts: number of times a ticket is handed out before it is dead-lettered
+        :param retry_delay_sec: delay before a failed ticket is retried, multiplied by the number of attempts
+        :param stop_group: id of the workers stopped by stop_workers and of the reports read by get_report, a new
+        one if not given so the standalone workers on other hosts never take the stop markers of a worker pool
+        :param journal_mode: DELETE, safe on a file system shared across hosts, or WAL when every process of the
+        queue runs on the same host
+        """
+        if journal_mode.upper() not in JOURNAL_MODES:
+            raise ValueError("Journal mode of the job queue must be one of {0}".format(', '.join(JOURNAL_MODES)))
+        self.path = path
+        self.queue_size = queue_size
+        self.visibility_timeout_sec = visibility_timeout_sec
+        self.max_attempts = max_attempts
+        self.retry_delay_sec = retry_delay_sec
+        self.stop_group = stop_group or uuid.uuid4().hex
+        self.journal_mode = journal_mode.upper()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode={0}".format(self.journal_mode))
+        conn.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, ticket TEXT, "
+                     "status TEXT, attempts INTEGER DEFAULT 0, available_at REAL, lease_id TEXT, "
+                     "lease_expires REAL, worker TEXT, last_error TEXT, updated_at REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS reports (id INTEGER PRIMARY KEY AUTOINCREMENT, report TEXT, "
+                     "stop_group TEXT)")
+        if 'stop_group' not in [column[1] for column in conn.execute("PRAGMA table_info(reports)")]:
+            conn.execute("ALTER TABLE reports ADD COLUMN stop_group TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS reports_stop_group ON reports (stop_group, id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stop_markers (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "stop_group TEXT)")
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _connect(self):
+        """
+        :return: connection of this thread, a forked process opens its own connections
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous={0}".format('NORMAL' if self.journal_mode == 'WAL' else 'FULL'))
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def put(self, job_ticket, timeout=None):
+        """
+        :param job_ticket: job ticket to enqueue, blocks while queue_size tickets are queued or leased, its reports go
+        to the stop group of this queue
+        :param timeout: seconds to wait for a free slot, None waits forever
+        """
+        conn = self._connect()
+        deadline = None if timeout is None else time.time() + timeout
+        while conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'leased')").fetchone()[0] \
+                >= self.queue_size:
+            if deadline is not None and time.time() >= deadline:
+                raise queue.Full
+            time.sleep(POLL_INTERVAL_SEC)
+        now = time.time()
+        conn.execute("INSERT INTO jobs (ticket, status, available_at, updated_at) VALUES (?, 'queued', ?, ?)",
+                     (json.dumps(dict(job_ticket, stop_group=self.stop_group), default=_json_default), now, now))
+
+    def get(self, timeout=None):
+        """
+        :description: Lease the oldest available ticket, a ticket whose lease expired is available again unless it
+        has used all its attempts, then it is dead-lettered
+        :param timeout: seconds to wait for a ticket, None waits forever
+        :return: next job ticket with its job_id and lease_id, None when the worker has to stop
+        """
+        conn = self._connect()
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for job_id, ticket in conn.execute(
+                        "SELECT id, ticket FROM jobs WHERE status = 'leased' AND lease_expires < ? "
+                        "AND attempts >= ?", (now, self.max_attempts)).fetchall():
+                    self._dead_letter(conn, job_id, json.loads(ticket), "Lease expired {0} times".format(
+                        self.max_attempts), now)
+                row = conn.execute("SELECT id, ticket FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+                                   "OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1",
+                                   (now, now)).fetchone()
+                if row:
+                    lease_id = uuid.uuid4().hex
+                    conn.execute("UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_id = ?, "
+                                 "lease_expires = ?, worker = ?, updated_at = ? WHERE id = ?",
+                                 (lease_id, now + self.visibility_timeout_sec, '{0}:{1}'.format(
+                                     os.uname().nodename, os.getpid()), now, row[0]))
+                    conn.execute("COMMIT")
+                    job_ticket = json.loads(row[1])
+                    job_ticket['job_id'] = row[0]
+                    job_ticket['lease_id'] = lease_id
+                    return job_ticket
+                pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                marker = None if pending else conn.execute(
+                    "SELECT id FROM stop_markers WHERE stop_group = ? LIMIT 1", (self.stop_group,)).fetchone()
+                if marker:
+                    conn.execute("DELETE FROM stop_markers WHERE id = ?", marker)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if marker:
+                return None
+            if deadline is not None and time.time() >= deadline:
+                raise queue.Empty
+            time.sleep(POLL_INTERVAL_SEC)
+
+    def task_done(self, job_ticket, report):
+        """
+        :description: A done job is removed and reported. A failed job is queued again after a delay, unless it is
+        not retryable (a corrupt frame) or used all its attempts, then it is dead-lettered and its failure reported.
+        The outcome of a lease which expired and was handed to another worker is ignored.
+        :param job_ticket: the job ticket which is processed, with its job_id and lease_id
+        :param report: dictionary with the outcome of the job
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT attempts FROM jobs WHERE id = ? AND lease_id = ? AND status = 'leased'",
+                               (job_ticket['job_id'], job_ticket['lease_id'])).fetchone()
+            if row is None:
+                logger.error("Lease of the job {0} expired before it finished, the outcome is ignored".format(
+                    job_ticket['job_id']))
+            elif report['status'] == 'done':
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_ticket['job_id'],))
+                self._report(conn, report, job_ticket)
+            elif report.get('retryable', True) and row[0] < self.max_attempts:
+                conn.execute("UPDATE jobs SET status = 'queued', available_at = ?, lease_id = NULL, "
+                             "last_error = ?, updated_at = ? WHERE id = ?",
+                             (now + self.retry_delay_sec * row[0], report.get('error'), now, job_ticket['job_id']))
+            else:
+                self._dead_letter(conn, job_ticket['job_id'], job_ticket, report.get('error'), now, report)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _dead_letter(self, conn, job_id, job_ticket, error, now, report=None):
+        conn.execute("UPDATE jobs SET status = 'dead', lease_id = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+                     (error, now, job_id))
+        report = dict(report or {"task_id": job_ticket.get('task_id'), "images_written": 0,
+                                 "content_hash": job_ticket.get('content_hash'),
+                                 "params_hash": job_ticket.get('params_hash')},
+                      status='failed', error=error, dead_lettered=True)
+        self._report(conn, report, job_ticket)
+        logger.error("Dead-lettered the job of {0} :: {1}".format(job_ticket.get('file'), error))
+
+    def _report(self, conn, report, job_ticket):
+        conn.execute("INSERT INTO reports (report, stop_group) VALUES (?, ?)",
+                     (json.dumps(report, default=_json_default), job_ticket.get('stop_group', self.stop_group)))
+
+    def get_report(self, timeout=None):
+        """
+        :param timeout: seconds to wait for a report, None waits forever
+        :return: next job report of the tickets put by this stop group or None when the report collector has to stop
+        """
+        conn = self._connect()
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT id, report FROM reports WHERE stop_group = ? ORDER BY id LIMIT 1",
+                                   (self.stop_group,)).fetchone()
+                if row:
+                    conn.execute("DELETE FROM reports WHERE id = ?", (row[0],))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if row:
+                return json.loads(row[1]) if row[1] is not None else None
+            if deadline is not None and time.time() >= deadline:
+                raise queue.Empty
+            time.sleep(POLL_INTERVAL_SEC)
+
+    def get_dead_letters(self, limit=100):
+        """
+        :return: list of the dead-lettered job tickets with their attempts and last error
+        """
+        rows = self._connect().execute("SELECT id, ticket, attempts, last_error FROM jobs WHERE status = 'dead' "
+                                       "ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [dict(json.loads(ticket), job_id=job_id, attempts=attempts, error=error)
+                for job_id, ticket, attempts, error in rows]
+
+    def recover_jobs(self, pid):
+        """
+        :description: Nothing to do, the leases of a worker process which died expire and its tickets are handed
+        out again or dead-lettered
+        :return: empty list
+        """
+        return []
+
+    def stop_workers(self, num_workers):
+        """
+        :description: Stop markers of this stop group, a worker takes one once no ticket is queued so the workers
+        drain the queue first
+        """
+        self._connect().executemany("INSERT INTO stop_markers (stop_group) VALUES (?)",
+                                    [(self.stop_group,)] * num_workers)
+
+    def stop_reports(self):
+        self._connect().execute("INSERT INTO reports (report, stop_group) VALUES (NULL, ?)", (self.stop_group,))
+
+
+JOB_QUEUE_BACKENDS = {
+    'local': LocalJobQueue,
+    'sqlite': SqliteJobQueue
+}
+
+
+def get_job_queue(backend='local', **kwargs):
+    """
+    :param backend: name of the queue backend, local or sqlite
+    :param kwargs: keyword arguments of the queue i.e queue_size, path
+    :return: job queue object of the given backend
+    """
+    if backend not in JOB_QUEUE_BACKENDS:
+        raise ValueError("Unknown job queue backend {0}".format(backend))
+    return JOB_QUEUE_BACKENDS[backend](**kwargs)
+
+
+def next_job_tickets(job_queue, idle_timeout=2.0, max_idle_sec=None):
+    """
+    :description: Take the job tickets from the queue until the stop marker, whenever the queue stays empty for
+    idle_timeout seconds IDLE is yielded so the worker writes the partially filled shards and the output of a
+    finished task is complete
+    :param job_queue: queue shared with the task manager
+    :param idle_timeout: seconds without a job ticket before IDLE is yielded
+    :param max_idle_sec: optional seconds without a job ticket before the worker stops on its own
+    :return: Generator of the job tickets and IDLE
+    """
+    last_ticket_at = time.time()
+    while True:
+        try:
+            job_ticket = job_queue.get(timeout=idle_timeout)
+        except queue.Empty:
+            yield IDLE
+            if max_idle_sec is not None and time.time() - last_ticket_at >= max_idle_sec:
+                return
+            continue
+        if job_ticket is None:
+            return
+        last_ticket_at = time.time()
+        yield job_ticket
+
+
+def _prefetch_job_image(job_ticket):
+    """
+    :return: the decoded image of the job ticket or the exception raised by the decode, the exception is raised
+    again by the worker loop so it fails the job instead of the prefetch stage
+    """
+    if job_ticket is IDLE:
+        return None
+    try:
+        return load_job_image(job_ticket)
+    except Exception as e:
+        return e
+
+
+def _release_reports(job_queue, held_reports):
+    """
+    :description: Report the jobs whose images are all in written shards, a job with an image in a shard which
+    couldn't be written is failed
+    :param held_reports: list of the job ticket, report and ShardReceipt of the jobs waiting for their shards
+    :return: list of the jobs still waiting
+    """
+    waiting = []
+    for job_ticket, report, receipt in held_reports:
+        if not receipt.complete:
+            waiting.append((job_ticket, report, receipt))
+            continue
+        if receipt.failed:
+            report['images_written'] -= receipt.failed
+            report['save_failures'] = report.get('save_failures', 0) + receipt.failed
+            report['error'] = '; '.join(filter(None, [report.get('error'), "Failed to write the shard of {0} "
+                                                      "images".format(receipt.failed)]))
+            report.update(status='failed', retryable=True)
+        job_queue.task_done(job_ticket, report)
+    return waiting
+
+
+def run_worker(job_queue, decode_cache_size=0, decoded_cache_dir=None, decode_threads=2, prefetch_depth=4,
+               writer_threads=2, write_queue_size=64, shard_flush_idle_sec=2.0, max_report_delay_sec=60.0,
+               log_queue=None, max_idle_sec=None):
+    """
+    :description: Worker loop, it takes the job tickets from the queue until it receives the stop marker. The
+    images are decoded ahead by the prefetch threads and saved by the writer threads, so disk reads, augmentation
+    and JPEG encoding overlap. A job of a packed output is reported once the shards holding its images are written,
+    so its images are never counted as written while they are only buffered by the shard writer.
+    :param job_queue: queue shared with the task manager
+    :param decode_cache_size: number of decoded images cached by the worker for repeated runs
+    :param decoded_cache_dir: optional directory of memory mapped decoded images shared by the workers
+    :param decode_threads: number of threads decoding images ahead, 0 decodes in the worker loop
+    :param prefetch_depth: number of job tickets decoded ahead of the augmentation
+    :param writer_threads: number of threads saving the images, 0 saves in the worker loop
+    :param write_queue_size: number of images waiting to be saved before the augmentation blocks
+    :param shard_flush_idle_sec: seconds without a job ticket before the partially filled shards are written
+    :param max_report_delay_sec: seconds a job report waits for its shards before the partially filled shards are
+    written, it has to stay below the visibility timeout of the sqlite queue
+    :param log_queue: log queue of the parent process, the records of the worker are written by its listener
+    :param max_idle_sec: optional seconds without a job ticket before the worker stops, i.e for a standalone worker
+    """
+    if log_queue is not None:
+        configure_worker_logging(log_queue)
+    metrics = get_metrics()
+    metrics.reset()
+    set_decode_cache_size(decode_cache_size, decoded_cache_dir)
+    image_writer = AsyncImageWriter(writer_threads, write_queue_size) if writer_threads else None
+    job_tickets = next_job_tickets(job_queue, shard_flush_idle_sec, max_idle_sec)
+    held_reports = []
+    held_since = None
+    for job_ticket, image_array in prefetch(job_tickets, _prefetch_job_image, prefetch_depth, decode_threads):
+        if job_ticket is IDLE:
+            flush_shard_writers()
+            held_reports = _release_reports(job_queue, held_reports)
+            continue
+        report = {"task_id": job_ticket.get('task_id'), "status": "done", "images_written": 0,
+                  "content_hash": job_ticket.get('content_hash'), "params_hash": job_ticket.get('params_hash')}
+        receipt = ShardReceipt()
+        try:
+            if isinstance(image_array, Exception):
+                raise image_array
+            report.update(execute_job(job_ticket, image_array, image_writer, receipt) or {})
+        except Exception as e:
+            logger.error("Failed to execute job for {0}".format(job_ticket.get('file')))
+            logger.error(str(e))
+            report['status'] = 'failed'
+            report['error'] = str(e)
+            report['retryable'] = not isinstance(e, CorruptImageError)
+        report['metrics'] = metrics.snapshot(reset=True)
+        if not held_reports:
+            held_since = time.time()
+        held_reports = _release_reports(job_queue, held_reports + [(job_ticket, report, receipt)])
+        if held_reports and time.time() - held_since >= max_report_delay_sec:
+            flush_shard_writers()
+            held_reports = _release_reports(job_queue, held_reports)
+    if image_writer:
+        image_writer.shutdown()
+    close_shard_writers()
+    _release_reports(job_queue, held_reports)
+
+
+class TaskTracker:
+    """
+    Keeps the progress of one task, a task is finished once all of its job tickets are submitted and every
+    submitted job is reported back either done or failed. A task whose submission raised is failed, the jobs it
+    submitted before are still run
+    """
+    def __init__(self, task_id, name):
+        self.task_id = task_id
+        self.name = name
+        self.images_discovered = 0
+        self.images_skipped = 0
+        self.images_written = 0
+        self.images_failed = 0
+        self.augmentation_failures = 0
+        self.stage_outputs = {}
+        self.jobs_queued = 0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.jobs_dead_lettered = 0
+        self.submission_complete = False
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def add_listener(self, listener):
+        """
+        :param listener: function called with every job report before the job is counted as finished
+        """
+        self.listeners.append(listener)
+
+    def image_discovered(self):
+        with self._lock:
+            self.images_discovered += 1
+        get_metrics().inc('images_discovered_total')
+
+    def image_skipped(self):
+        with self._lock:
+            self.images_skipped += 1
+        get_metrics().inc('images_skipped_total')
+
+    def job_queued(self):
+        with self._lock:
+            self.jobs_queued += 1
+
+    def job_finished(self, report):
+        for listener in self.listeners:
+            listener(report)
+        with self._lock:
+            if report['status'] == 'done':
+                self.jobs_done += 1
+            else:
+                self.jobs_failed += 1
+            if report.get('dead_lettered'):
+                self.jobs_dead_lettered += 1
+            self.images_written += report.get('images_written', 0)
+            self.images_failed += report.get('save_failures', 0)
+            self.augmentation_failures += report.get('augmentation_failures', 0)
+            for aug_type, count in report.get('stage_outputs', {}).items():
+                self.stage_outputs[aug_type] = self.stage_outputs.get(aug_type, 0) + count
+            self._check_finished()
+
+    def fail(self, error):
+        """
+        :param error: message of the error which stopped the submission of the jobs
+        """
+        with self._lock:
+            self.error = error
+
+    def close_submission(self):
+        with self._lock:
+            self.submission_complete = True
+            self._check_finished()
+
+    def _check_finished(self):
+        if self.submission_complete and self.jobs_done + self.jobs_failed >= self.jobs_queued:
+            self.finished_at = time.time()
+            self._finished.set()
+
+    @property
+    def is_finished(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: seconds to wait, None waits until the task is finished
+        :return: True if the task is finished
+        """
+        return self._finished.wait(timeout)
+
+    def to_dict(self):
+        """
+        :description: Snapshot of the progress. While the directories are still scanned the ETA is estimated from
+        the images discovered so far, it's a lower bound until all the jobs of the task are submitted
+        :return: dictionary of the counters, throughput in images/sec and ETA in seconds
+        """
+        with self._lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            jobs_finished = self.jobs_done + self.jobs_failed
+            jobs_pending = self.jobs_queued - jobs_finished
+            throughput = self.images_written / elapsed if elapsed > 0 else 0.0
+            eta = None
+            if self.is_finished:
+                eta = 0.0
+            elif jobs_finished:
+                jobs_expected = self.jobs_queued
+                if not self.submission_complete:
+                    jobs_expected = max(jobs_expected, self.images_discovered - self.images_skipped)
+                eta = (jobs_expected - jobs_finished) * elapsed / jobs_finished
+            if self.error is not None:
+                status = "failed"
+            else:
+                status = "finished" if self.is_finished else "running"
+            return {
+                "task_id": self.task_id,
+                "name": self.name,
+                "status": status,
+                "error": self.error,
+                "images_discovered": self.images_discovered,
+                "images_skipped": self.images_skipped,
+                "jobs_queued": self.jobs_queued,
+                "jobs_pending": jobs_pending,
+                "jobs_done": self.jobs_done,
+                "jobs_failed": self.jobs_failed,
+                "jobs_dead_lettered": self.jobs_dead_lettered,
+                "images_written": self.images_written,
+                "images_failed": self.images_failed,
+                "augmentation_failures": self.augmentation_failures,
+                "stage_outputs": dict(self.stage_outputs),
+                "elapsed_sec": round(elapsed, 3),
+                "throughput_images_per_sec": round(throughput, 3),
+                "eta_sec": round(eta, 3) if eta is not None else None
+            }
+
+
+class WorkerPool:
+    """
+    Fixed size pool of worker processes consuming job tickets from a bounded job queue. The report collector checks
+    every WORKER_CHECK_INTERVAL_SEC that the workers are alive, a worker which died is replaced and the jobs it held
+    are recovered by the job queue so the tasks still finish.
+    """
+    def __init__(self, num_workers=None, queue_size=DEFAULT_QUEUE_SIZE, backend='local', queue_options=None,
+                 **worker_options):
+        """
+        :param num_workers: number of worker processes, all the cores if not given
+        :param queue_size: number of job tickets the queue holds before submitting blocks
+        :param backend: name of the job queue backend, local or sqlite
+        :param queue_options: keyword arguments of the job queue per backend i.e {"sqlite": {"path": "queue.sqlite3"}}
+        :param worker_options: keyword arguments of run_worker i.e decode_threads, writer_threads
+        """
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.worker_options = worker_options
+        self.job_queue = get_job_queue(backend, queue_size=queue_size, **(queue_options or {}).get(backend, {}))
+        self._workers = []
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._collector = None
+        self._accepting = False
+        self._workers_lock = threading.Lock()
+
+    def _start_worker(self):
+        worker = multiprocessing.Process(target=run_worker, args=(self.job_queue,),
+                                         kwargs=dict(self.worker_options, log_queue=get_log_queue()), daemon=True)
+        worker.start()
+        return worker
+
+    def start(self):
+        for _ in range(self.num_workers):
+            self._workers.append(self._start_worker())
+        self._collector = threading.Thread(target=self._collect_reports, daemon=True)
+        self._collector.start()
+        self._accepting = True
+        logger.info("Started worker pool with {0} workers".format(self.num_workers))
+
+    def register_task(self, task_id, name):
+        """
+        :param task_id: unique id of the task
+        :param name: Name of the task i.e MotoGP
+        :return: tracker of the task
+        """
+        tracker = TaskTracker(task_id, name)
+        with self._lock:
+            self._tasks[task_id] = tracker
+        return tracker
+
+    def get_task(self, task_id):
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def list_tasks(self):
+        with self._lock:
+            return list(self._tasks.values())
+
+    def submit(self, task_id, job_ticket):
+        """
+        :description: Enqueue the job ticket for the given task, blocks while the job queue is full
+        :param task_id: id of a registered task
+        :param job_ticket: job ticket to execute
+        """
+        if not self._accepting:
+            raise RuntimeError("Worker pool is not accepting jobs")
+        job_ticket['task_id'] = task_id
+        self.get_task(task_id).job_queued()
+        self.job_queue.put(job_ticket)
+
+    def _collect_reports(self):
+        checked_at = time.time()
+        while True:
+            try:
+                report = self.job_queue.get_report(timeout=WORKER_CHECK_INTERVAL_SEC)
+            except queue.Empty:
+                report = False
+            if report is None:
+                break
+            if report:
+                self._handle_report(report)
+            if time.time() - checked_at >= WORKER_CHECK_INTERVAL_SEC:
+                self._check_workers()
+                checked_at = time.time()
+
+    def _handle_report(self, report):
+        metrics = get_metrics()
+        metrics.merge(report.pop('metrics', {}))
+        metrics.inc('jobs_total', status=report['status'])
+        if report.get('save_failures'):
+            metrics.inc('images_failed_total', report['save_failures'])
+        if report.get('augmentation_failures'):
+            metrics.inc('augmentation_failures_total', report['augmentation_failures'])
+        for aug_type, count in report.get('stage_outputs', {}).items():
+            metrics.inc('images_produced_total', count, stage=aug_type)
+        tracker = self.get_task(report['task_id'])
+        if tracker:
+            tracker.job_finished(report)
+
+    def _check_workers(self):
+        """
+        :description: Replace the workers which died and report the jobs they held. The reports the dead worker
+        sent before it died are handled first, the stop marker of the reports is only sent after shutdown
+        """
+        with self._workers_lock:
+            if not self._accepting:
+                return
+            dead_workers = [index for index, worker in enumerate(self._workers) if not worker.is_alive()]
+            if not dead_workers:
+                return
+            while True:
+                try:
+                    report = self.job_queue.get_report(timeout=0)
+                except queue.Empty:
+                    break
+                if report is None:
+                    self.job_queue.stop_reports()
+                    break
+                self._handle_report(report)
+            for index in dead_workers:
+                worker = self._workers[index]
+                logger.error("Worker process {0} died with exit code {1}, starting a new one".format(
+                    worker.pid, worker.exitcode))
+                get_metrics().inc('workers_restarted_total')
+                for report in self.job_queue.recover_jobs(worker.pid):
+                    self._handle_report(report)
+                self._workers[index] = self._start_worker()
+
+    def shutdown(self, wait=True):
+        """
+        :description: Stop accepting jobs and stop the workers, with wait the queued jobs are finished first
+        :param wait: wait for the queued jobs, otherwise the workers are terminated
+        """
+        with self._workers_lock:
+            if not self._accepting:
+                return
+            self._accepting = False
+        if wait:
+            self.job_queue.stop_workers(len(self._workers))
+            for worker in self._workers:
+                worker.join()
+        else:
+            for worker in self._workers:
+                worker.terminate()
+        self.job_queue.stop_reports()
+        self._collector.join()
+        self._workers = []
+        logger.info("Worker pool stopped")
@@ -1,4 +1,94 @@
 import logging as log
+import logging.handlers
+import multiprocessing
+import threading
+import atexit
+import os
+
+LOG_LEVEL_ENV = 'IMAGE_AUGMENTATION_LOG_LEVEL'
+DEFAULT_LOG_LEVEL = 'INFO'
+LOG_FORMAT = '%(levelname)s:%(processName)s:%(message)s'
+
+_log_queue = None
+_listener = None
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def get_log_level(level=None):
+    """
+    :param level: name or number of the level, the IMAGE_AUGMENTATION_LOG_LEVEL environment variable or INFO if
+    not given
+    :return: numeric logging level
+    """
+    level = level or os.environ.get(LOG_LEVEL_ENV, DEFAULT_LOG_LEVEL)
+    if isinstance(level, int):
+        return level
+    numeric_level = log.getLevelName(str(level).upper())
+    return numeric_level if isinstance(numeric_level, int) else log.INFO
+
+
+def configure_logging(level=None):
+    """
+    :description: Configure the root logger once per process. The records are put on a multiprocessing queue by a
+    QueueHandler and written to stderr by a QueueListener thread, so logging never blocks on the stream. Forked
+    worker processes inherit the handler and their records are written by the listener of the parent.
+    :param level: name or number of the level, see get_log_level
+    """
+    global _log_queue, _listener, _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _log_queue = multiprocessing.Queue(-1)
+        stream_handler = log.StreamHandler()
+        stream_handler.setFormatter(log.Formatter(LOG_FORMAT))
+        _set_queue_handler(_log_queue, level)
+        _listener = logging.handlers.QueueListener(_log_queue, stream_handler)
+        _listener.start()
+        atexit.register(stop_logging)
+        _configured = True
+
+
+def configure_worker_logging(log_queue, level=None):
+    """
+    :description: Send the records of a worker process to the listener of the parent process, a spawned process
+    stops the listener it started on import
+    :param log_queue: queue returned by get_log_queue in the parent process
+    :param level: name or number of the level, see get_log_level
+    """
+    global _log_queue, _configured
+    with _configure_lock:
+        if log_queue is not _log_queue:
+            stop_logging()
+        _log_queue = log_queue
+        _set_queue_handler(log_queue, level)
+        _configured = True
+
+
+def _set_queue_handler(log_queue, level):
+    root = log.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(get_log_level(level))
+
+
+def get_log_queue():
+    """
+    :return: queue the records of this process are sent to
+    """
+    configure_logging()
+    return _log_queue
+
+
+def stop_logging():
+    """
+    :description: Write the pending records and stop the listener thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def get_logger():
@@ -6,7 +96,8 @@ def get_logger():
     :description: This is just a dummy placeholder for logging, this module can be
     configured and developed to manage the logs as per company standard,
     By configuring this logs can be delivered to logz.io, elastic search, cloudwatch, redis logger etc.
+    The logging is configured once, on the first call.
     :return:
     """
-    log.basicConfig(format='%(levelname)s:%(message)s', level=log.DEBUG)
+    configure_logging()
     return log
@@ -0,0 +1,104 @@
+from log_manager import get_logger
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+logger = get_logger()
+
+MANIFEST_FILE_NAME = '.manifest.sqlite3'
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def get_params_hash(**params):
+    """
+    :param params: everything which changes the outputs of a frame i.e augmentation chains, split, image size
+    :return: hash of the parameters
+    """
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=list).encode('utf-8')).hexdigest()
+
+
+class TaskManifest:
+    """
+    Per data source record of the outputs already produced for a (source file content hash, augmentation
+    parameters hash) pair. A file is hashed only when its size or mtime differ from the last run, every finished job
+    is committed right away so an interrupted task resumes with the frames which are not recorded yet. Only loose
+    jpeg outputs are recorded, the images of the npy and tfrecord outputs are still buffered by the shard writers
+    when their jobs are reported.
+    """
+    def __init__(self, manifest_path):
+        """
+        :param manifest_path: path of the sqlite manifest file
+        """
+        self.manifest_path = manifest_path
+        os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(manifest_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, "
+                           "mtime_ns INTEGER, content_hash TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS outputs (content_hash TEXT, params_hash TEXT, "
+                           "outputs TEXT, completed_at REAL, PRIMARY KEY (content_hash, params_hash))")
+        self._conn.commit()
+
+    def get_content_hash(self, path):
+        """
+        :param path: path of the source file
+        :return: sha1 of the file content, read from the manifest if the size and mtime didn't change
+        """
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, content_hash FROM files WHERE path = ?",
+                                     (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        content_hash = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                content_hash.update(chunk)
+        content_hash = content_hash.hexdigest()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                               (path, stat.st_size, stat.st_mtime_ns, content_hash))
+            self._conn.commit()
+        return content_hash
+
+    def is_done(self, content_hash, params_hash):
+        """
+        :return: True if the outputs of the frame with these parameters are already produced
+        """
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM outputs WHERE content_hash = ? AND params_hash = ?",
+                                      (content_hash, params_hash)).fetchone() is not None
+
+    def record(self, content_hash, params_hash, outputs):
+        """
+        :param content_hash: hash of the source file
+        :param params_hash: hash of the augmentation parameters
+        :param outputs: list of the names of the produced images
+        """
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)",
+                               (content_hash, params_hash, json.dumps(outputs), time.time()))
+            self._conn.commit()
+
+    def on_job_finished(self, report):
+        """
+        :description: Listener of the task tracker, records the jobs which wrote every one of their outputs, a job
+        with a failed augmentation or save is reported failed and done again by the next run
+        :param report: job report received from the worker
+        """
+        if report['status'] == 'done' and report.get('content_hash') and not report.get('save_failures') \
+                and not report.get('augmentation_failures'):
+            try:
+                self.record(report['content_hash'], report['params_hash'], report.get('outputs', []))
+            except Exception as e:
+                logger.error("Failed to record the job in the manifest {0}".format(self.manifest_path))
+                logger.error(str(e))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
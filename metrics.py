@@ -0,0 +1,128 @@
+from contextlib import contextmanager
+import threading
+import time
+
+METRIC_PREFIX = 'image_augmentation_'
+
+
+class Metrics:
+    """
+    Process local counters and timers with optional labels. Every worker process keeps its own instance and sends
+    the increments since its last report along with the job report, the parent process merges them so the totals
+    of the whole pool can be exported in the Prometheus text format.
+    """
+    def __init__(self):
+        self._counters = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """
+        :param name: name of the counter i.e jobs_total
+        :param value: increment
+        :param labels: labels of the counter i.e status="done"
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """
+        :param name: name of the timer i.e decode_seconds
+        :param seconds: duration to record
+        :param labels: labels of the timer i.e stage="CROP"
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total = self._timers.get(key, (0, 0.0))
+            self._timers[key] = (count + 1, total + seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        :description: Record the duration of the with block, also when it raises
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self, reset=False):
+        """
+        :param reset: start from zero again, used by the workers to send increments only
+        :return: picklable dictionary of the counters and timers
+        """
+        with self._lock:
+            snapshot = {"counters": list(self._counters.items()), "timers": list(self._timers.items())}
+            if reset:
+                self._counters = {}
+                self._timers = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """
+        :param snapshot: snapshot of another process, also after a round trip through json
+        """
+        with self._lock:
+            for key, value in snapshot.get('counters', []):
+                key = _metric_key(key)
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, (count, total) in snapshot.get('timers', []):
+                key = _metric_key(key)
+                current_count, current_total = self._timers.get(key, (0, 0.0))
+                self._timers[key] = (current_count + count, current_total + total)
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._timers = {}
+
+    def to_prometheus(self):
+        """
+        :return: counters and timers in the Prometheus text exposition format, a timer is exported as a summary
+        with its _count and _sum
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timers = sorted(self._timers.items())
+        for metric_name, samples in _group(counters):
+            lines.append('# TYPE {0} counter'.format(metric_name))
+            for labels, value in samples:
+                lines.append('{0}{1} {2}'.format(metric_name, _format_labels(labels), value))
+        for metric_name, samples in _group(timers):
+            lines.append('# TYPE {0} summary'.format(metric_name))
+            for labels, (count, total) in samples:
+                lines.append('{0}_count{1} {2}'.format(metric_name, _format_labels(labels), count))
+                lines.append('{0}_sum{1} {2:.6f}'.format(metric_name, _format_labels(labels), total))
+        return '\n'.join(lines) + '\n'
+
+
+def _metric_key(key):
+    name, labels = key
+    return name, tuple(tuple(label) for label in labels)
+
+
+def _group(items):
+    groups = {}
+    for (name, labels), value in items:
+        groups.setdefault(METRIC_PREFIX + name, []).append((labels, value))
+    return sorted(groups.items())
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in labels) + '}'
+
+
+metrics = Metrics()
+
+
+def get_metrics():
+    """
+    :return: metrics of this process
+    """
+    return metrics
@@ -0,0 +1,44 @@
+from log_manager import get_logger
+from modules.registry import register_augmentation, Param
+from modules.kernels import fuse
+
+log = get_logger()
+
+
+@register_augmentation('COLOR_JITTER', schema={
+    "brightness_range": Param((list, tuple)),
+    "contrast_range": Param((list, tuple)),
+    "target_count": Param(int, default=1),
+    "seed": Param(int)
+})
+def image_color_jitter(raw_img, brightness_range=None, contrast_range=None, target_count=1, seed=None):
+    """
+    :param raw_img: input uint8 image array
+    :param brightness_range: [low, high] of the value added to the pixels i.e [-32, 32]
+    :param contrast_range: [low, high] of the contrast factor i.e [0.8, 1.2]
+    :param target_count: number of jittered images
+    :param seed: seed for reproducible jitter
+    :return: generator of the jittered image and a prefix
+    """
+    ops = []
+    if brightness_range:
+        ops.append({"name": "brightness", "delta_range": brightness_range})
+    if contrast_range:
+        ops.append({"name": "contrast", "factor_range": contrast_range})
+    kernel = fuse(ops, seed)
+    for i in range(target_count):
+        yield kernel(raw_img), [str(i)]
+
+
+@register_augmentation('NORMALIZE', schema={
+    "mean": Param((int, float, list, tuple), required=True),
+    "std": Param((int, float, list, tuple), required=True)
+}, float_output=True)
+def image_normalize(raw_img, mean, std):
+    """
+    :param raw_img: input image array
+    :param mean: mean subtracted from the pixels, one value or one per channel i.e [123.7, 116.3, 103.5]
+    :param std: standard deviation the pixels are divided by, one value or one per channel
+    :return: generator of the float32 normalized image and a prefix
+    """
+    yield fuse([{"name": "normalize", "mean": mean, "std": std}])(raw_img), ['norm']
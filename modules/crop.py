@@ -1,8 +1,14 @@
 from log_manager import get_logger
+from modules.registry import register_augmentation, Param
+import numpy as np
 
 log = get_logger()
 
 
+@register_augmentation('CROP', schema={
+    "crop_dimensions": Param((list, tuple), required=True),
+    "crop_type": Param(str, choices=('left_down_center', 'random'))
+})
 def image_cropping(raw_img, crop_dimensions, crop_type='random'):
     """
     :param raw_img: input image array
@@ -23,6 +29,33 @@ def image_cropping(raw_img, crop_dimensions, crop_type='random'):
             raise ValueError("Right Now crop except only left down center")
 
 
+def image_cropping_batch(raw_images, crop_dimensions, crop_type='left_down_center'):
+    """
+    :description: Batched version of image_cropping, the crops are zero copy views of the input stack
+    :param raw_images: NHWC stack of image arrays
+    :param crop_dimensions: list of dimensions for the cropping
+    :param crop_type: crop type , towards center or random etc
+    :return: list of NHWC cropped stack and a prefix, one per crop dimension
+    """
+    raw_images = np.asarray(raw_images)
+    if raw_images.ndim != 4:
+        log.error("Batch cropping expects a NHWC stack of images")
+        raise ValueError("Please provide the images as an array of shape (N, H, W, C)")
+    crops = []
+    for dim in crop_dimensions:
+        try:
+            crop_dy, crop_dx = dim[0], dim[1]
+        except IndexError:
+            log.error("Please pass the appropriate dimension of the log")
+            raise ValueError("Please provide the dimension in list of list format")
+        if crop_type == 'left_down_center':
+            crops.append((raw_images[:, 0:crop_dy, 0:crop_dx, :], [str(crop_dy), str(crop_dy)]))
+        if crop_type == 'random':
+            log.error("This type of cropping is not implemented")
+            raise ValueError("Right Now crop except only left down center")
+    return crops
+
+
 if __name__ == '__main__':
     # test_destination = '/Users/surajitkundu/Google Drive/Cloud & DevOps/ML Tasks/ML Engineer task/destination/test.jpeg'
     # for img in image_cropping('/Users/surajitkundu/Google Drive/Cloud & DevOps/ML Tasks/ML Engineer task/sample_frames'
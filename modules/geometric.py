@@ -0,0 +1,29 @@
+from log_manager import get_logger
+from modules.registry import register_augmentation, Param
+from modules.kernels import flip, rot90, FLIP_AXES
+
+log = get_logger()
+
+
+@register_augmentation('FLIP', schema={
+    "mode": Param(str, default='horizontal', choices=tuple(FLIP_AXES))
+})
+def image_flip(raw_img, mode='horizontal'):
+    """
+    :param raw_img: input image array
+    :param mode: horizontal, vertical or both
+    :return: generator of the flipped view of the image and a prefix
+    """
+    yield flip(raw_img, mode), [mode]
+
+
+@register_augmentation('ROTATE90', schema={
+    "k": Param(int, default=1, choices=(1, 2, 3))
+})
+def image_rotate90(raw_img, k=1):
+    """
+    :param raw_img: input image array
+    :param k: number of counter clockwise quarter turns
+    :return: generator of the rotated view of the image and a prefix
+    """
+    yield rot90(raw_img, k), [str(90 * k)]
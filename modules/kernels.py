@@ -0,0 +1,214 @@
+from log_manager import get_logger
+import numpy as np
+
+logger = get_logger()
+
+FLIP_AXES = {
+    'horizontal': (-2,),
+    'vertical': (-3,),
+    'both': (-3, -2)
+}
+SPATIAL_OPS = ('flip', 'rot90')
+AFFINE_OPS = ('brightness', 'contrast', 'normalize')
+
+
+def flip(images, mode='horizontal'):
+    """
+    :param images: HxWxC image or NHWC stack of images
+    :param mode: horizontal, vertical or both
+    :return: flipped view of the images, nothing is copied
+    """
+    if mode not in FLIP_AXES:
+        raise ValueError("Flip mode must be one of {0}".format(', '.join(FLIP_AXES)))
+    return np.flip(images, FLIP_AXES[mode])
+
+
+def rot90(images, k=1):
+    """
+    :param images: HxWxC image or NHWC stack of images
+    :param k: number of counter clockwise quarter turns
+    :return: rotated view of the images, nothing is copied
+    """
+    return np.rot90(images, k, axes=(-3, -2))
+
+
+def adjust_brightness(images, delta):
+    """
+    :param images: HxWxC uint8 image or NHWC stack of images
+    :param delta: value added to every pixel, clipped to 0-255
+    :return: uint8 images
+    """
+    return fuse([{"name": "brightness", "delta": delta}])(images)
+
+
+def adjust_contrast(images, factor):
+    """
+    :param images: HxWxC uint8 image or NHWC stack of images
+    :param factor: contrast factor around the mean gray level of each image, 1 keeps the image
+    :return: uint8 images
+    """
+    return fuse([{"name": "contrast", "factor": factor}])(images)
+
+
+def normalize(images, mean, std):
+    """
+    :param images: HxWxC image or NHWC stack of images
+    :param mean: mean subtracted from the pixels, one value or one per channel
+    :param std: standard deviation the pixels are divided by, one value or one per channel
+    :return: float32 images
+    """
+    return fuse([{"name": "normalize", "mean": mean, "std": std}])(images)
+
+
+class FusedKernel:
+    """
+    Chain of flip, rot90, brightness, contrast and normalize ops evaluated in a single pass, with the same result
+    as applying the ops one after the other. Flips and rotations only change the strides of a view. On uint8
+    images every pixel op becomes a 256 entry lookup table per image and channel, rounded and clipped to 0-255 like
+    the output of a single op, and the tables of the chain are composed into one. The image means needed by a
+    contrast op are computed from the histogram of the input mapped through the tables of the previous ops. The
+    images are then read once through the composed table, into uint8 or into float32 when the chain ends with a
+    normalize op. Other dtypes are transformed in one float64 buffer, clipped after every op.
+    """
+    def __init__(self, ops, seed=None):
+        """
+        :param ops: list of ops i.e [{"name": "flip", "mode": "horizontal"}, {"name": "brightness", "delta": 20}],
+        brightness and contrast take either a fixed delta/factor or a delta_range/factor_range to jitter each image,
+        normalize has to be the last pixel op of the chain
+        :param seed: seed or numpy Generator of the jitter
+        """
+        for op in ops:
+            if not isinstance(op, dict):
+                raise ValueError("An op must be a dictionary i.e {{\"name\": \"flip\"}}, got {0!r}".format(op))
+            if op.get('name') not in SPATIAL_OPS + AFFINE_OPS:
+                raise ValueError("Unknown op {0}, expected one of {1}".format(
+                    op.get('name'), ', '.join(SPATIAL_OPS + AFFINE_OPS)))
+            if op['name'] == 'flip' and op.get('mode', 'horizontal') not in FLIP_AXES:
+                raise ValueError("Flip mode must be one of {0}".format(', '.join(FLIP_AXES)))
+        self.ops = [dict(op) for op in ops]
+        pixel_ops = [op['name'] for op in self.ops if op['name'] in AFFINE_OPS]
+        if 'normalize' in pixel_ops[:-1]:
+            raise ValueError("normalize has to be the last pixel op of the chain")
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, images):
+        """
+        :param images: HxWxC image or NHWC stack of images
+        :return: transformed images of the same rank, uint8 or float32 with a normalize op
+        """
+        images = np.asarray(images)
+        if images.ndim not in (3, 4):
+            logger.error("Kernels expect an HxWxC image or a NHWC stack of images")
+            raise ValueError("Please provide the images as an array of shape (H, W, C) or (N, H, W, C)")
+        batch = images.ndim == 4
+        source = images if batch else images[None]
+        view = source
+        pixel_ops = []
+        for op in self.ops:
+            if op['name'] == 'flip':
+                view = flip(view, op.get('mode', 'horizontal'))
+            elif op['name'] == 'rot90':
+                view = rot90(view, op.get('k', 1))
+            else:
+                pixel_ops.append(op)
+        if pixel_ops:
+            if view.dtype == np.uint8:
+                view = self._apply_lookup_table(source, view, pixel_ops)
+            else:
+                view = self._apply_float(view, pixel_ops)
+        return view if batch else view[0]
+
+    def _draw(self, op, name, count, neutral):
+        """
+        :return: per image value of the op parameter, drawn uniformly from its range when a range is given
+        """
+        value_range = op.get(name + '_range')
+        if value_range is not None:
+            low, high = value_range
+            return self.rng.uniform(low, high, size=(count, 1, 1, 1))
+        return np.full((count, 1, 1, 1), op.get(name, neutral), dtype=np.float64)
+
+    def _apply_lookup_table(self, source, view, pixel_ops):
+        """
+        :param source: NHWC uint8 images before the spatial ops, the histograms don't depend on them
+        :param view: NHWC uint8 view after the spatial ops
+        :param pixel_ops: brightness, contrast and normalize ops in the order of the chain
+        :return: NHWC uint8 or float32 images
+        """
+        number_of_images, channels = view.shape[0], view.shape[-1]
+        lut = np.tile(np.arange(256, dtype=np.float64), (number_of_images, channels, 1))
+        histograms = None
+        for op in pixel_ops:
+            name = op['name']
+            if name == 'brightness':
+                delta = self._draw(op, 'delta', number_of_images, 0.0).reshape(number_of_images, 1, 1)
+                lut = _to_levels(lut + delta)
+            elif name == 'contrast':
+                if histograms is None:
+                    histograms = _histograms(source)
+                channel_means = (histograms * lut).sum(axis=-1) / histograms.sum(axis=-1)
+                gray_mean = channel_means.mean(axis=-1).reshape(number_of_images, 1, 1)
+                factor = self._draw(op, 'factor', number_of_images, 1.0).reshape(number_of_images, 1, 1)
+                lut = _to_levels(factor * lut + (1 - factor) * gray_mean)
+            elif name == 'normalize':
+                mean = np.broadcast_to(np.asarray(op.get('mean', 0.0), dtype=np.float64), (channels,))
+                std = np.broadcast_to(np.asarray(op.get('std', 1.0), dtype=np.float64), (channels,))
+                lut = (lut - mean[:, None]) / std[:, None]
+        lut = lut.astype(np.float32 if pixel_ops[-1]['name'] == 'normalize' else np.uint8)
+        out = np.empty(view.shape, dtype=lut.dtype)
+        for n in range(number_of_images):
+            for c in range(channels):
+                out[n, ..., c] = lut[n, c][view[n, ..., c]]
+        return out
+
+    def _apply_float(self, view, pixel_ops):
+        """
+        :param view: NHWC images of any numeric dtype after the spatial ops
+        :param pixel_ops: brightness, contrast and normalize ops in the order of the chain
+        :return: NHWC uint8 or float32 images
+        """
+        number_of_images = view.shape[0]
+        out = np.array(view, dtype=np.float64)
+        for op in pixel_ops:
+            name = op['name']
+            if name == 'brightness':
+                out += self._draw(op, 'delta', number_of_images, 0.0)
+                np.clip(out, 0, 255, out=out)
+            elif name == 'contrast':
+                gray_mean = out.mean(axis=(1, 2, 3), keepdims=True)
+                factor = self._draw(op, 'factor', number_of_images, 1.0)
+                out *= factor
+                out += (1 - factor) * gray_mean
+                np.clip(out, 0, 255, out=out)
+            elif name == 'normalize':
+                out -= np.asarray(op.get('mean', 0.0), dtype=np.float64)
+                out /= np.asarray(op.get('std', 1.0), dtype=np.float64)
+        if pixel_ops[-1]['name'] == 'normalize':
+            return out.astype(np.float32)
+        return np.rint(out).astype(np.uint8)
+
+
+def _to_levels(values):
+    return np.clip(np.rint(values), 0, 255)
+
+
+def _histograms(images):
+    """
+    :param images: NHWC uint8 images
+    :return: array of shape (N, C, 256) of the pixel counts per image, channel and level
+    """
+    number_of_images, channels = images.shape[0], images.shape[-1]
+    histograms = np.empty((number_of_images, channels, 256), dtype=np.float64)
+    for n in range(number_of_images):
+        for c in range(channels):
+            histograms[n, c] = np.bincount(images[n, ..., c].ravel(), minlength=256)
+    return histograms
+
+
+def fuse(ops, seed=None):
+    """
+    :param ops: list of ops, see FusedKernel
+    :param seed: seed or numpy Generator of the jitter
+    :return: FusedKernel applying all the ops in one pass
+    """
+    return FusedKernel(ops, seed)
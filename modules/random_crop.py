@@ -1,52 +1,138 @@
 from log_manager import get_logger
-from random import choice
-import math
+from modules.registry import register_augmentation, Param
+import numpy as np
 
 logger = get_logger()
 
 
-def get_random_indices(height, width, crop_dy, crop_dx, y_exception_indices, x_exception_indices):
+MAX_REJECTIONS = 32
+
+
+class RandomCropSampler:
     """
-    This function will give you a random center without overlap based on the image height width and cropping dimension
-    :param height: height of the image i.e 270
-    :param width: width of the image i.e 270
-    :param crop_dy: crop dimension i.e 80
-    :param crop_dx: crop dimension x i.e 80
-    :param y_exception_indices: list of y pixel position which can't be considered to make sure no overlap
-    :param x_exception_indices:list of x pixel position which can't be considered to make sure no overlap
-    :return: returns the two random pixel indices which will be used for cropping
+    Samples uniformly distributed, non overlapping crop origins. A bitmap keeps every top left corner where a crop
+    still fits without overlapping the crops already placed, a sample is drawn by rejection against the bitmap and
+    falls back to picking among the remaining free corners when the bitmap is mostly occupied.
     """
-    try:
-        rand_y_indices = choice([i for i in range(math.ceil(crop_dy / 2), math.ceil(height - (crop_dy / 2)))
-                                 if i not in y_exception_indices])
-        rand_x_indices = choice([i for i in range(math.ceil(crop_dy / 2), math.ceil(width - (crop_dx / 2)))
-                                 if i not in x_exception_indices])
-        return rand_y_indices, rand_x_indices
-    except IndexError as e:
-        logger.error("No More random index can be generated")
-        logger.error(str(e))
-        return 0, 0
+    def __init__(self, height, width, crop_dy, crop_dx, seed=None):
+        """
+        :param height: height of the image i.e 270
+        :param width: width of the image i.e 270
+        :param crop_dy: crop dimension i.e 80
+        :param crop_dx: crop dimension x i.e 80
+        :param seed: seed or numpy Generator for reproducible crops
+        """
+        self.crop_dy = crop_dy
+        self.crop_dx = crop_dx
+        self.free = np.ones((max(height - crop_dy + 1, 0), max(width - crop_dx + 1, 0)), dtype=bool)
+        self.free_count = self.free.size
+        self.rng = np.random.default_rng(seed)
 
+    def sample(self):
+        """
+        :return: (y, x) top left corner of the next crop or None if no more crop can be placed
+        """
+        if self.free_count == 0:
+            return None
+        rows, cols = self.free.shape
+        for _ in range(MAX_REJECTIONS):
+            y, x = int(self.rng.integers(rows)), int(self.rng.integers(cols))
+            if self.free[y, x]:
+                break
+        else:
+            free_indices = np.flatnonzero(self.free)
+            y, x = divmod(int(free_indices[self.rng.integers(len(free_indices))]), cols)
+        self._occupy(y, x)
+        return y, x
 
-def image_random_cropping(image_array, crop_dimensions, target_count):
+    def _occupy(self, y, x):
+        region = self.free[max(y - self.crop_dy + 1, 0):y + self.crop_dy, max(x - self.crop_dx + 1, 0):x + self.crop_dx]
+        self.free_count -= int(np.count_nonzero(region))
+        region[...] = False
+
+
+@register_augmentation('RANDOM_CROP', schema={
+    "crop_dimensions": Param((list, tuple), required=True),
+    "target_count": Param(int, required=True),
+    "seed": Param(int)
+})
+def image_random_cropping(image_array, crop_dimensions, target_count, seed=None):
     """
     :param image_array: input image array
     :param crop_dimensions: dimension of crop
     :param target_count: Number of random crop i.e 2 or 3
+    :param seed: seed for reproducible crops
     :return: Generator of the cropped image
     """
     height, width = image_array.shape[0], image_array.shape[1]
     crop_dy, crop_dx = crop_dimensions[0], crop_dimensions[1]
-    y_exception_indices = []
-    x_exception_indices = []
+    sampler = RandomCropSampler(height, width, crop_dy, crop_dx, seed)
     for i in range(target_count):
-        rand_y_indices, rand_x_indices = get_random_indices(height, width, crop_dy, crop_dx,
-                                                            y_exception_indices, x_exception_indices)
-        y_exception_indices.extend([i for i in range(rand_y_indices - crop_dy, rand_y_indices + crop_dy)])
-        x_exception_indices.extend([i for i in range(rand_x_indices - crop_dx, rand_y_indices + crop_dx)])
-        if rand_y_indices != 0 or rand_x_indices != 0:
-            yield image_array[rand_y_indices - 40:rand_y_indices + 40, rand_x_indices - 40:rand_x_indices + 40, :], [
-                str(crop_dy), str(crop_dy), str(i)]
+        origin = sampler.sample()
+        if origin is None:
+            logger.error("No More random index can be generated, {0} of {1} crops placed".format(i, target_count))
+            return
+        y, x = origin
+        yield image_array[y:y + crop_dy, x:x + crop_dx, :], [str(crop_dy), str(crop_dy), str(i)]
+
+
+def get_random_origins(height, width, crop_dy, crop_dx, target_count, seed=None):
+    """
+    :description: Top left corners of target_count non overlapping random crops
+    :param height: height of the image i.e 270
+    :param width: width of the image i.e 270
+    :param crop_dy: crop dimension i.e 80
+    :param crop_dx: crop dimension x i.e 80
+    :param target_count: Number of random crop i.e 2 or 3
+    :param seed: seed or numpy Generator for reproducible crops
+    :return: list of (y, x) origins, shorter than target_count if no more crop fits
+    """
+    sampler = RandomCropSampler(height, width, crop_dy, crop_dx, seed)
+    origins = []
+    for _ in range(target_count):
+        origin = sampler.sample()
+        if origin is None:
+            break
+        origins.append(origin)
+    return origins
+
+
+def image_random_cropping_batch(image_arrays, crop_dimensions, target_count, copy=True, seed=None):
+    """
+    :description: Batched version of image_random_cropping, the crops of the whole stack are gathered with one
+    vectorized indexing operation
+    :param image_arrays: NHWC stack of image arrays
+    :param crop_dimensions: dimension of crop
+    :param target_count: Number of random crop per image i.e 2 or 3
+    :param copy: If True returns one array of shape (N, target_count, crop_dy, crop_dx, C) else a list of list of
+    zero copy views
+    :param seed: seed for reproducible crops
+    :return: cropped images and the list of prefix, one per crop index
+    """
+    image_arrays = np.asarray(image_arrays)
+    if image_arrays.ndim != 4:
+        logger.error("Batch cropping expects a NHWC stack of images")
+        raise ValueError("Please provide the images as an array of shape (N, H, W, C)")
+    number_of_images, height, width = image_arrays.shape[:3]
+    crop_dy, crop_dx = crop_dimensions[0], crop_dimensions[1]
+    rng = np.random.default_rng(seed)
+    origins = np.zeros((number_of_images, target_count, 2), dtype=np.intp)
+    for n in range(number_of_images):
+        image_origins = get_random_origins(height, width, crop_dy, crop_dx, target_count, rng)
+        if len(image_origins) < target_count:
+            logger.error("No More random index can be generated")
+            raise ValueError("Only {0} non overlapping crops fit in the image".format(len(image_origins)))
+        origins[n] = image_origins
+    prefixes = [[str(crop_dy), str(crop_dy), str(i)] for i in range(target_count)]
+    if not copy:
+        crops = [[image_arrays[n, y:y + crop_dy, x:x + crop_dx, :] for y, x in origins[n]]
+                 for n in range(number_of_images)]
+        return crops, prefixes
+    rows = origins[:, :, 0, None] + np.arange(crop_dy)
+    cols = origins[:, :, 1, None] + np.arange(crop_dx)
+    batch_index = np.arange(number_of_images)[:, None, None, None]
+    crops = image_arrays[batch_index, rows[:, :, :, None], cols[:, :, None, :]]
+    return crops, prefixes
 
 
 if __name__ == '__main__':
@@ -0,0 +1,164 @@
+from log_manager import get_logger
+from functools import lru_cache
+import importlib
+import pkgutil
+import os
+
+logger = get_logger()
+
+PLUGIN_PACKAGE = 'modules'
+
+
+class Param:
+    """
+    Schema of one keyword argument of an augmentation
+    """
+    def __init__(self, types, required=False, default=None, choices=None, validator=None):
+        """
+        :param types: type or tuple of types the value must have i.e (int, float)
+        :param required: True if the request has to give the value
+        :param default: value used when the request doesn't give one, None leaves the function default
+        :param choices: optional list of the allowed values
+        :param validator: optional function called with the value, it raises ValueError or TypeError for a value
+        the types and choices can't describe i.e a chain of ops
+        """
+        self.types = types if isinstance(types, tuple) else (types,)
+        self.required = required
+        self.default = default
+        self.choices = choices
+        self.validator = validator
+
+    def validate(self, aug_type, name, value):
+        """
+        :return: the value, the default if the value is None
+        """
+        if value is None:
+            if self.required:
+                raise ValueError("{0} requires the parameter {1}".format(aug_type, name))
+            return self.default
+        if isinstance(value, bool) and bool not in self.types or not isinstance(value, self.types):
+            raise ValueError("{0} parameter {1} must be of type {2}, got {3!r}".format(
+                aug_type, name, ' or '.join(t.__name__ for t in self.types), value))
+        if self.choices is not None and value not in self.choices:
+            raise ValueError("{0} parameter {1} must be one of {2}, got {3!r}".format(
+                aug_type, name, ', '.join(str(c) for c in self.choices), value))
+        if self.validator is not None:
+            try:
+                self.validator(value)
+            except (TypeError, ValueError) as e:
+                raise ValueError("{0} parameter {1} is invalid :: {2}".format(aug_type, name, e))
+        return value
+
+
+class Augmentation:
+    """
+    Registered augmentation, the function takes an HxWxC image array and the keyword arguments and yields the
+    augmented arrays with their name prefix
+    """
+    def __init__(self, name, function, schema=None, float_output=False):
+        self.name = name
+        self.function = function
+        self.schema = schema or {}
+        self.float_output = float_output
+
+    def outputs_float(self, kwargs):
+        """
+        :param kwargs: validated keyword arguments
+        :return: True if the augmented arrays are float instead of uint8
+        """
+        if callable(self.float_output):
+            return bool(self.float_output(kwargs))
+        return bool(self.float_output)
+
+    def validate_kwargs(self, kwargs):
+        """
+        :param kwargs: keyword arguments of the request
+        :return: keyword arguments with the defaults of the schema, raises ValueError if they don't match it
+        """
+        kwargs = dict(kwargs or {})
+        unknown = sorted(set(kwargs) - set(self.schema))
+        if unknown:
+            raise ValueError("Unknown parameters {0} of {1}, expected {2}".format(
+                ', '.join(unknown), self.name, ', '.join(sorted(self.schema))))
+        validated = {}
+        for name, param in self.schema.items():
+            value = param.validate(self.name, name, kwargs.get(name))
+            if value is not None:
+                validated[name] = value
+        return validated
+
+
+AUGMENTATIONS = {}
+
+
+def register_augmentation(name, schema=None, float_output=False):
+    """
+    :description: Decorator declaring an augmentation of a plugin module of the modules package
+    :param name: name of the augmentation used in the requests i.e FLIP
+    :param schema: dictionary of the parameter name and its Param
+    :param float_output: True if the augmentation produces float arrays, or a function of the keyword arguments
+    telling it, those can only be saved in the npy or tfrecord output formats
+    :return: decorator returning the function unchanged
+    """
+    def decorator(function):
+        if name in AUGMENTATIONS and AUGMENTATIONS[name].function is not function:
+            raise ValueError("Augmentation {0} is already registered".format(name))
+        AUGMENTATIONS[name] = Augmentation(name, function, schema, float_output)
+        return function
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def load_plugins():
+    """
+    :description: Import every module of the modules package once per process, importing a module registers its
+    augmentations
+    :return: names of the imported modules
+    """
+    modules_dir = os.path.dirname(os.path.realpath(__file__))
+    module_names = []
+    for module_info in pkgutil.iter_modules([modules_dir]):
+        if module_info.name == 'registry':
+            continue
+        try:
+            importlib.import_module('.' + module_info.name, package=PLUGIN_PACKAGE)
+            module_names.append(module_info.name)
+        except Exception as e:
+            logger.error("Failed to load the augmentation module {0}".format(module_info.name))
+            logger.error(str(e))
+    return tuple(module_names)
+
+
+def get_augmentation(name):
+    """
+    :param name: name of the augmentation i.e CROP
+    :return: registered Augmentation or None
+    """
+    load_plugins()
+    return AUGMENTATIONS.get(name)
+
+
+def validate_kwargs(name, kwargs):
+    """
+    :param name: name of the augmentation i.e CROP
+    :param kwargs: keyword arguments of the request
+    :return: validated keyword arguments, unchanged if the augmentation isn't registered
+    """
+    augmentation = get_augmentation(name)
+    if augmentation is None:
+        return kwargs
+    return augmentation.validate_kwargs(kwargs)
+
+
+def validate_output_format(name, kwargs, output_format):
+    """
+    :description: JPEG files only hold uint8 pixels, saving a float array as JPEG rescales it to 0-255 and the
+    values are lost
+    :param name: name of the augmentation i.e NORMALIZE
+    :param kwargs: validated keyword arguments
+    :param output_format: output format of the data source i.e jpeg, npy, tfrecord
+    """
+    augmentation = get_augmentation(name)
+    if augmentation and output_format == 'jpeg' and augmentation.outputs_float(kwargs):
+        raise ValueError("{0} produces float32 images which can't be saved as jpeg, use the npy or tfrecord output "
+                         "format of the data source".format(name))
@@ -0,0 +1,27 @@
+from log_manager import get_logger
+from modules.registry import register_augmentation, Param
+from modules.kernels import fuse
+
+log = get_logger()
+
+
+@register_augmentation('TRANSFORM', schema={
+    "ops": Param((list, tuple), required=True, validator=fuse),
+    "target_count": Param(int, default=1),
+    "seed": Param(int)
+}, float_output=lambda kwargs: any(isinstance(op, dict) and op.get('name') == 'normalize'
+                                    for op in kwargs['ops']))
+def image_transform(raw_img, ops, target_count=1, seed=None):
+    """
+    :description: Chain of flip, rot90, brightness, contrast and normalize ops fused into a single pass, see
+    modules.kernels.FusedKernel
+    :param raw_img: input image array
+    :param ops: list of ops i.e [{"name": "flip", "mode": "horizontal"}, {"name": "brightness", "delta_range": [-32,
+    32]}]
+    :param target_count: number of transformed images, the jitter is drawn again for every image
+    :param seed: seed for reproducible jitter
+    :return: generator of the transformed image and a prefix
+    """
+    kernel = fuse(ops, seed)
+    for i in range(target_count):
+        yield kernel(raw_img), [str(i)]
@@ -0,0 +1,83 @@
+from log_manager import get_logger
+from PIL import Image
+import numpy as np
+
+logger = get_logger()
+
+RESAMPLING_FILTERS = {
+    'nearest': Image.NEAREST,
+    'box': Image.BOX,
+    'bilinear': Image.BILINEAR,
+    'hamming': Image.HAMMING,
+    'bicubic': Image.BICUBIC,
+    'lanczos': Image.LANCZOS
+}
+DEFAULT_FILTER = 'bicubic'
+
+
+def get_filter(name=None):
+    """
+    :param name: name of the resampling filter i.e bilinear, None for the default bicubic filter
+    :return: PIL resampling filter
+    """
+    try:
+        return RESAMPLING_FILTERS[(name or DEFAULT_FILTER).lower()]
+    except KeyError:
+        logger.error("Unknown resampling filter {0}".format(name))
+        raise ValueError("Resampling filter must be one of {0}".format(', '.join(RESAMPLING_FILTERS)))
+
+
+def open_resized(path, size=None, resample=None, draft=True, reducing_gap=None):
+    """
+    :description: Decode the image and resize it to the given size. For a JPEG much larger than the target the
+    decoder is put in draft mode, the DCT scaling then decodes directly at 1/2, 1/4 or 1/8 of the resolution (never
+    below the target size) and only the remaining step goes through the resampling filter.
+    :param path: jpeg, png or any other image input path
+    :param size: (width, height) to resize to, the original size if None
+    :param resample: name of the resampling filter i.e bilinear, bicubic by default
+    :param draft: allow the JPEG draft mode decoding
+    :param reducing_gap: optional PIL reducing_gap, resizes in two steps for a faster downscale
+    :return: RGB PIL image of the given size
+    """
+    img = Image.open(path)
+    if size:
+        size = tuple(size)
+        if draft and img.format == 'JPEG':
+            img.draft('RGB', size)
+    img = img.convert('RGB')
+    if size and img.size != size:
+        img = img.resize(size, get_filter(resample), reducing_gap=reducing_gap)
+    return img
+
+
+def resize_batch(images, size, resample=None):
+    """
+    :description: Resize a NHWC stack of images to the same size into a single preallocated output stack. An
+    integer downscale with the box filter uses PIL's block reduce, every other case goes through the resampling
+    filter.
+    :param images: NHWC uint8 stack of images
+    :param size: (width, height) to resize to
+    :param resample: name of the resampling filter, bicubic by default
+    :return: NHWC uint8 stack of the resized images
+    """
+    images = np.asarray(images)
+    if images.ndim != 4:
+        logger.error("Batch resizing expects a NHWC stack of images")
+        raise ValueError("Please provide the images as an array of shape (N, H, W, C)")
+    number_of_images, height, width, channels = images.shape
+    target_width, target_height = size
+    if (target_width, target_height) == (width, height):
+        return images
+    resample_filter = get_filter(resample)
+    reduce_factor = None
+    if resample_filter == Image.BOX and height % target_height == 0 and width % target_width == 0:
+        reduce_factor = (width // target_width, height // target_height)
+    resized = np.empty((number_of_images, target_height, target_width, channels), dtype=images.dtype)
+    for n in range(number_of_images):
+        img = Image.fromarray(images[n].squeeze(-1) if channels == 1 else images[n])
+        if reduce_factor:
+            img = img.reduce(reduce_factor)
+        else:
+            img = img.resize((target_width, target_height), resample_filter)
+        resized[n] = np.asarray(img).reshape(target_height, target_width, channels)
+    return resized
@@ -0,0 +1,162 @@
+from log_manager import get_logger
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import queue
+import json
+import os
+
+logger = get_logger()
+
+DEFAULT_IMAGE_TYPES = ('jpeg', 'png')
+EXTENSION_ALIASES = {
+    'jpg': ('jpg', 'jpeg'),
+    'jpeg': ('jpg', 'jpeg'),
+    'tif': ('tif', 'tiff'),
+    'tiff': ('tif', 'tiff')
+}
+LISTING_CACHE_FILE_NAME = '.listing_cache.json'
+DEFAULT_SCAN_THREADS = 8
+RESULT_QUEUE_SIZE = 10000
+
+_END = object()
+
+
+def get_extensions(image_type=None):
+    """
+    :param image_type: list of image types of the data source i.e ["jpg", "png"]
+    :return: tuple of the lower case file extensions with a leading dot, jpg and jpeg match each other
+    """
+    extensions = set()
+    for extension in image_type or DEFAULT_IMAGE_TYPES:
+        extension = extension.lower().lstrip('.')
+        extensions.update(EXTENSION_ALIASES.get(extension, (extension,)))
+    return tuple('.' + extension for extension in sorted(extensions))
+
+
+class DirectoryScanner:
+    """
+    Parallel directory scanner based on os.scandir, every directory is listed by a thread of the pool and the
+    matching files are streamed to the caller as soon as they are found. With a listing cache a directory whose
+    mtime didn't change since the last scan is not listed again.
+    """
+    def __init__(self, image_type=None, threads=DEFAULT_SCAN_THREADS, cache_path=None):
+        """
+        :param image_type: list of image types to keep i.e ["jpg", "png"]
+        :param threads: number of directories listed in parallel
+        :param cache_path: optional json file where the listing is cached between runs
+        """
+        self.extensions = get_extensions(image_type)
+        self.threads = threads
+        self.cache_path = cache_path
+        self._cache = self._load_cache()
+        self._cache_lock = threading.Lock()
+
+    def _load_cache(self):
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error("Failed to load the listing cache {0}".format(self.cache_path))
+            logger.error(str(e))
+            return {}
+
+    def save_cache(self):
+        """
+        :description: Write the listing cache atomically, so an interrupted scan never leaves a broken cache
+        """
+        if not self.cache_path:
+            return
+        temp_path = '{0}.{1}.tmp'.format(self.cache_path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+            with self._cache_lock:
+                with open(temp_path, 'w') as f:
+                    json.dump(self._cache, f)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            logger.error("Failed to save the listing cache {0}".format(self.cache_path))
+            logger.error(str(e))
+
+    def list_dir(self, directory):
+        """
+        :param directory: absolute path of the directory
+        :return: tuple of the file names and the sub directory names of the directory
+        """
+        mtime = os.stat(directory).st_mtime_ns
+        with self._cache_lock:
+            cached = self._cache.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        files = []
+        sub_dirs = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    sub_dirs.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+        if self.cache_path:
+            with self._cache_lock:
+                self._cache[directory] = [mtime, files, sub_dirs]
+        return files, sub_dirs
+
+    def scan(self, source_directory):
+        """
+        :param source_directory: Directory to crawl and find out all the images
+        :return: Generator of the image's absolute path, in no particular order
+        """
+        results = queue.Queue(maxsize=RESULT_QUEUE_SIZE)
+        stop = threading.Event()
+        pending = [0]
+        pending_lock = threading.Lock()
+        executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='scanner')
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def submit(directory):
+            with pending_lock:
+                pending[0] += 1
+            executor.submit(visit, directory)
+
+        def visit(directory):
+            try:
+                files, sub_dirs = self.list_dir(directory)
+                for sub_dir in sub_dirs:
+                    submit(os.path.join(directory, sub_dir))
+                for file in files:
+                    if file.lower().endswith(self.extensions):
+                        put(os.path.join(directory, file))
+            except OSError as e:
+                logger.error("Failed to scan the directory {0}".format(directory))
+                logger.error(str(e))
+            finally:
+                with pending_lock:
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+                if finished:
+                    put(_END)
+
+        submit(os.path.abspath(source_directory))
+        completed = False
+        try:
+            while True:
+                item = results.get()
+                if item is _END:
+                    completed = True
+                    break
+                yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
+            if completed:
+                self.save_cache()
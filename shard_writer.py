@@ -0,0 +1,291 @@
+from log_manager import get_logger
+import numpy as np
+import threading
+import json
+import uuid
+import os
+
+logger = get_logger()
+
+DEFAULT_SHARD_SIZE = 1024
+NO_SPLIT = 'all'
+
+
+def get_storage_array(raw_image):
+    """
+    :param raw_image: image array to write
+    :return: the array itself for uint8 and float32/float64 images, other dtypes clipped to uint8
+    """
+    raw_image = np.asarray(raw_image)
+    if raw_image.dtype == np.uint8 or raw_image.dtype in (np.float32, np.float64):
+        return raw_image
+    if np.issubdtype(raw_image.dtype, np.floating):
+        return raw_image.astype(np.float32)
+    return np.clip(raw_image, 0, 255).astype(np.uint8)
+
+
+class ShardReceipt:
+    """
+    Counts the images of a job appended to the shard writers and the ones whose shard is on disk, the job is
+    reported once all its images are written so a worker which dies never loses the images of a finished job
+    """
+    def __init__(self):
+        self.appended = 0
+        self.written = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def image_appended(self):
+        with self._lock:
+            self.appended += 1
+
+    def image_written(self):
+        with self._lock:
+            self.written += 1
+
+    def image_failed(self):
+        with self._lock:
+            self.failed += 1
+
+    @property
+    def complete(self):
+        """
+        :return: True once the shard of every appended image is written or failed
+        """
+        with self._lock:
+            return self.written + self.failed >= self.appended
+
+
+def _images_written(receipts):
+    for receipt in receipts:
+        if receipt is not None:
+            receipt.image_written()
+
+
+def _images_failed(receipts):
+    for receipt in receipts:
+        if receipt is not None:
+            receipt.image_failed()
+
+
+class NpyShardWriter:
+    """
+    Packs the augmented images into fixed size shards of raw arrays instead of one JPEG per image. Images of the
+    same split, shape and dtype are stacked into target_dir/<split>/shard-<writer>-<HxWxC>-<dtype>-<number>.npy,
+    which can be opened with np.load(mmap_mode='r'), and every image is listed in target_dir/<split>/index-<writer>
+    .jsonl with its shard, row and dtype. uint8 and float images keep their dtype, i.e the float32 output of a
+    normalization, other dtypes are clipped to uint8. With zlib compression the shards are written as compressed
+    .npz files.
+    """
+    def __init__(self, target_dir, shard_size=DEFAULT_SHARD_SIZE, compression='none'):
+        """
+        :param target_dir: directory where the shards are written
+        :param shard_size: number of images per shard
+        :param compression: none or zlib
+        """
+        if compression not in ('none', 'zlib'):
+            raise ValueError("Unsupported npy shard compression {0}".format(compression))
+        self.target_dir = target_dir
+        self.shard_size = shard_size
+        self.compression = compression
+        self.writer_id = uuid.uuid4().hex[:8]
+        self._buffers = {}
+        self._shard_numbers = {}
+        self._lock = threading.Lock()
+
+    def append(self, split, raw_image, target_file_name, receipt=None):
+        """
+        :param split: train, test or None when the data set is not split
+        :param raw_image: image array to write
+        :param target_file_name: name of the image, recorded in the index
+        :param receipt: optional ShardReceipt of the job, told when the shard of the image is written
+        :return: True once the image is buffered
+        """
+        raw_image = get_storage_array(raw_image)
+        key = (split or NO_SPLIT, raw_image.shape, raw_image.dtype.name)
+        if receipt is not None:
+            receipt.image_appended()
+        with self._lock:
+            images, names, receipts = self._buffers.setdefault(key, ([], [], []))
+            images.append(np.array(raw_image))
+            names.append(target_file_name)
+            receipts.append(receipt)
+            if len(images) >= self.shard_size:
+                self._write_shard(key)
+        return True
+
+    def _write_shard(self, key):
+        images, names, receipts = self._buffers.pop(key)
+        try:
+            self._save_shard(key, images, names)
+        except Exception as e:
+            logger.error("Failed to write a shard of {0} images in {1}".format(len(names), self.target_dir))
+            logger.error(str(e))
+            _images_failed(receipts)
+        else:
+            _images_written(receipts)
+
+    def _save_shard(self, key, images, names):
+        split, shape, dtype = key
+        shard_number = self._shard_numbers.get(key, 0)
+        self._shard_numbers[key] = shard_number + 1
+        split_dir = os.path.join(self.target_dir, split)
+        os.makedirs(split_dir, exist_ok=True)
+        shard_name = 'shard-{0}-{1}-{2}-{3:05d}'.format(self.writer_id, 'x'.join(str(d) for d in shape), dtype,
+                                                        shard_number)
+        shard_array = np.stack(images)
+        if self.compression == 'zlib':
+            shard_name += '.npz'
+            np.savez_compressed(os.path.join(split_dir, shard_name), images=shard_array)
+        else:
+            shard_name += '.npy'
+            np.save(os.path.join(split_dir, shard_name), shard_array)
+        with open(os.path.join(split_dir, 'index-{0}.jsonl'.format(self.writer_id)), 'a') as f:
+            for row, name in enumerate(names):
+                f.write(json.dumps({"name": name, "shard": shard_name, "row": row, "dtype": dtype}) + '\n')
+        logger.info("Done :: Shard saved {0} with {1} images".format(shard_name, len(names)))
+
+    def flush(self):
+        """
+        :description: Write the partially filled shards
+        """
+        with self._lock:
+            for key in list(self._buffers):
+                self._write_shard(key)
+
+    def close(self):
+        self.flush()
+
+
+class TFRecordShardWriter:
+    """
+    Packs the augmented images into TFRecord shards of tf.train.Example records holding the raw bytes, the shape,
+    the dtype and the name of the image, uint8 and float images keep their dtype. TensorFlow is only imported when
+    this output format is used.
+    """
+    def __init__(self, target_dir, shard_size=DEFAULT_SHARD_SIZE, compression='none'):
+        """
+        :param target_dir: directory where the shards are written
+        :param shard_size: number of images per shard
+        :param compression: none, gzip or zlib
+        """
+        import tensorflow as tf
+        if compression not in ('none', 'gzip', 'zlib'):
+            raise ValueError("Unsupported tfrecord shard compression {0}".format(compression))
+        self._tf = tf
+        self.target_dir = target_dir
+        self.shard_size = shard_size
+        self.compression = '' if compression == 'none' else compression.upper()
+        self.writer_id = uuid.uuid4().hex[:8]
+        self._writers = {}
+        self._shard_numbers = {}
+        self._lock = threading.Lock()
+
+    def append(self, split, raw_image, target_file_name, receipt=None):
+        """
+        :param split: train, test or None when the data set is not split
+        :param raw_image: image array to write
+        :param target_file_name: name of the image
+        :param receipt: optional ShardReceipt of the job, told when the shard of the record is closed
+        :return: True once the record is written
+        """
+        tf = self._tf
+        raw_image = get_storage_array(raw_image)
+        height, width, channels = raw_image.shape
+        example = tf.train.Example(features=tf.train.Features(feature={
+            'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[raw_image.tobytes()])),
+            'height': tf.train.Feature(int64_list=tf.train.Int64List(value=[height])),
+            'width': tf.train.Feature(int64_list=tf.train.Int64List(value=[width])),
+            'channels': tf.train.Feature(int64_list=tf.train.Int64List(value=[channels])),
+            'dtype': tf.train.Feature(bytes_list=tf.train.BytesList(value=[raw_image.dtype.name.encode('utf-8')])),
+            'name': tf.train.Feature(bytes_list=tf.train.BytesList(value=[target_file_name.encode('utf-8')]))
+        }))
+        split = split or NO_SPLIT
+        with self._lock:
+            writer, receipts = self._writers.get(split) or (self._open_shard(split), [])
+            writer.write(example.SerializeToString())
+            if receipt is not None:
+                receipt.image_appended()
+            receipts.append(receipt)
+            if len(receipts) >= self.shard_size:
+                self._writers.pop(split, None)
+                self._close_shard(writer, receipts)
+            else:
+                self._writers[split] = (writer, receipts)
+        return True
+
+    def _close_shard(self, writer, receipts):
+        try:
+            writer.close()
+        except Exception as e:
+            logger.error("Failed to write a shard of {0} records in {1}".format(len(receipts), self.target_dir))
+            logger.error(str(e))
+            _images_failed(receipts)
+        else:
+            _images_written(receipts)
+
+    def _open_shard(self, split):
+        shard_number = self._shard_numbers.get(split, 0)
+        self._shard_numbers[split] = shard_number + 1
+        split_dir = os.path.join(self.target_dir, split)
+        os.makedirs(split_dir, exist_ok=True)
+        shard_path = os.path.join(split_dir, 'shard-{0}-{1:05d}.tfrecord'.format(self.writer_id, shard_number))
+        options = self._tf.io.TFRecordOptions(compression_type=self.compression)
+        return self._tf.io.TFRecordWriter(shard_path, options=options)
+
+    def flush(self):
+        """
+        :description: Close the partially filled shards, the next image of a split starts a new shard
+        """
+        with self._lock:
+            for writer, receipts in self._writers.values():
+                self._close_shard(writer, receipts)
+            self._writers = {}
+
+    def close(self):
+        self.flush()
+
+
+SHARD_WRITERS = {
+    'npy': NpyShardWriter,
+    'tfrecord': TFRecordShardWriter
+}
+
+_shard_writers = {}
+_shard_writers_lock = threading.Lock()
+
+
+def get_shard_writer(target_dir, output):
+    """
+    :param target_dir: directory where the shards are written
+    :param output: output config of the data source i.e {"format": "npy", "shard_size": 1024, "compression": "none"}
+    :return: shard writer of this process for the target directory and output config
+    """
+    output_format = output['format']
+    shard_size = output.get('shard_size', DEFAULT_SHARD_SIZE)
+    compression = output.get('compression', 'none')
+    key = (target_dir, output_format, shard_size, compression)
+    with _shard_writers_lock:
+        if key not in _shard_writers:
+            if output_format not in SHARD_WRITERS:
+                raise ValueError("Unknown output format {0}".format(output_format))
+            _shard_writers[key] = SHARD_WRITERS[output_format](target_dir, shard_size, compression)
+        return _shard_writers[key]
+
+
+def flush_shard_writers():
+    """
+    :description: Write the partially filled shards of every shard writer of this process
+    """
+    with _shard_writers_lock:
+        writers = list(_shard_writers.values())
+    for writer in writers:
+        writer.flush()
+
+
+def close_shard_writers():
+    with _shard_writers_lock:
+        writers = list(_shard_writers.values())
+        _shard_writers.clear()
+    for writer in writers:
+        writer.close()
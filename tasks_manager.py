@@ -1,79 +1,266 @@
 from log_manager import get_logger
 from config_manager import ConfigurationManager
-from worker import execute_job
-from multiprocessing import Process
+from job_queue import WorkerPool
+from manifest import TaskManifest, get_params_hash, MANIFEST_FILE_NAME
+from modules.registry import validate_kwargs, validate_output_format
+from dataset_split import get_split_ratios
+from resize import get_filter
+from scanner import DirectoryScanner, DEFAULT_SCAN_THREADS, LISTING_CACHE_FILE_NAME
+import threading
+import atexit
+import uuid
 import os
 
 logger = get_logger()
 
+PROGRESS_LOG_INTERVAL_SEC = 30
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+class TaskValidationError(ValueError):
+    """
+    Raised by start_task when a task of the request can't be started, no task of the request is started then
+    """
+
+
+def get_worker_pool():
+    """
+    :description: Start the worker pool on first use, the pool is shared by all the tasks of this process
+    :return: the running worker pool
+    """
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            pool_config = ConfigurationManager('dev').get_worker_pool_config() or {}
+            _worker_pool = WorkerPool(**pool_config)
+            _worker_pool.start()
+            atexit.register(_worker_pool.shutdown)
+        return _worker_pool
+
 
 def start_task(tasks_details):
     """
     :description: This Function will check the certain parameters in the input dictionary and call handle_task
-    to create the job ticket
+    to create the job ticket. Every task of the request is validated before any of them is started, so a bad data
+    source or augmentation is reported to the caller instead of failing in the background
     :param tasks_details: It's a dictionary contains the details of the task it's going to execute
-    :return: It will validate the input dictionary and send a response back either Success or Failed
+    :return: the started task ids, raises TaskValidationError if a task of the request is invalid
     """
     for task_info in tasks_details:
-        task_element = task_info.keys()
-        if all(element in task_element for element in ['name', 'augmentations']):
-            task = Process(target=handle_task, kwargs=task_info)
-            task.start()
-            logger.info("Started task {0}".format(task_info['name']))
-        else:
-            logger.error("Invalid request")
-            return "Failed to load the task please double check !!"
-    return "{0} tasks started".format(len(tasks_details))
+        validate_task(task_info)
+    task_ids = []
+    for task_info in tasks_details:
+        task_id = uuid.uuid4().hex
+        get_worker_pool().register_task(task_id, task_info['name'])
+        task_ids.append(task_id)
+        task = threading.Thread(target=handle_task, kwargs=dict(task_info, task_id=task_id), daemon=True)
+        task.start()
+        logger.info("Started task {0}".format(task_info['name']))
+    return {"message": "{0} tasks started".format(len(tasks_details)), "task_ids": task_ids}
+
+
+def validate_task(task_info, conf=None):
+    """
+    :description: Check that the data source of the task is configured and its source directories exist, and that
+    every augmentation is configured, its keyword arguments match its schema and its output fits the output format
+    of the data source, and that the train test split ratios, the input image size and the resize options are valid
+    :param task_info: dictionary of the task i.e {"name": "MotoGP", "augmentations": [{"FLIP": {}}]}
+    :param conf: optional ConfigurationManager
+    :return: the augmentation chains merged with the configuration, raises TaskValidationError
+    """
+    if not isinstance(task_info, dict) or not all(element in task_info for element in ['name', 'augmentations']):
+        logger.error("Invalid request")
+        raise TaskValidationError("Every task requires the name and augmentations fields")
+    conf = conf or ConfigurationManager('dev')
+    name = task_info['name']
+    data_source = conf.get_data_source(name)
+    if not data_source:
+        logger.error("Unknown data source {0}".format(name))
+        raise TaskValidationError("Unknown data source {0}".format(name))
+    for source_dir in data_source.get('source_dir', ()):
+        if not os.path.isdir(source_dir):
+            logger.error("Source directory {0} of {1} doesn't exist".format(source_dir, name))
+            raise TaskValidationError("Source directory {0} of {1} doesn't exist".format(source_dir, name))
+    train_test_split = task_info.get('train_test_split')
+    if train_test_split:
+        try:
+            if not isinstance(train_test_split, dict):
+                raise ValueError("train_test_split must be a dictionary i.e {\"train_ratio\": 80, \"test_ratio\": 20}")
+            get_split_ratios(train_test_split)
+        except TypeError:
+            logger.error("Invalid train test split of task {0}".format(name))
+            raise TaskValidationError("The train test split ratios must be numbers, got {0}".format(train_test_split))
+        except ValueError as e:
+            logger.error("Invalid train test split of task {0}".format(name))
+            logger.error(str(e))
+            raise TaskValidationError(str(e))
+    try:
+        validate_resize(task_info.get('input_image_size'), task_info.get('resize'))
+    except ValueError as e:
+        logger.error("Invalid resize options of task {0}".format(name))
+        logger.error(str(e))
+        raise TaskValidationError(str(e))
+    output_format = data_source.get('output', {}).get('format', 'jpeg')
+    try:
+        return get_augmentation_chains(conf, task_info['augmentations'], output_format)
+    except ValueError as e:
+        logger.error("Invalid augmentations of task {0}".format(name))
+        logger.error(str(e))
+        raise TaskValidationError(str(e))
 
 
-def crawl_dir(source_directory):
+def validate_resize(input_image_size=None, resize=None):
+    """
+    :description: A bad size or resize option would make the decode of every frame of the task fail
+    :param input_image_size: optional [width, height] the images are resized to
+    :param resize: optional resize options i.e {"filter": "bilinear", "draft": true, "reducing_gap": 2.0}
     """
-    :description: This function is to crawl the given directory and return a generator of the images
+    if input_image_size is not None:
+        if not isinstance(input_image_size, (list, tuple)) or len(input_image_size) != 2 or not all(
+                isinstance(d, int) and not isinstance(d, bool) and d > 0 for d in input_image_size):
+            raise ValueError("input_image_size must be [width, height] in pixels, got {0!r}".format(input_image_size))
+    if resize is None:
+        return
+    if not isinstance(resize, dict):
+        raise ValueError("resize must be a dictionary i.e {{\"filter\": \"bilinear\"}}, got {0!r}".format(resize))
+    get_filter(resize.get('filter'))
+    reducing_gap = resize.get('reducing_gap')
+    if reducing_gap is not None and (not isinstance(reducing_gap, (int, float)) or reducing_gap < 1):
+        raise ValueError("resize reducing_gap must be a number of at least 1, got {0!r}".format(reducing_gap))
+
+
+def get_augmentation_chains(conf, augmentations, output_format):
+    """
+    :param conf: ConfigurationManager
+    :param augmentations: list of dictionary of the augmentation name and its keyword arguments
+    :param output_format: output format of the data source i.e jpeg, npy, tfrecord
+    :return: list of the augmentation chains, every augmentation merged with its configuration and its validated
+    keyword arguments, raises ValueError
+    """
+    augmentation_chains = []
+    for aug in augmentations:
+        if not isinstance(aug, dict):
+            raise ValueError("An augmentation chain must be a dictionary, got {0!r}".format(aug))
+        merged_aug_parameters = []
+        for aug_type in list(aug.keys()):
+            aug_config = conf.get_aug_parameters(aug_type)
+            if not aug_config:
+                raise ValueError("Unknown augmentation {0}".format(aug_type))
+            kwargs = validate_kwargs(aug_type, aug[aug_type])
+            validate_output_format(aug_type, kwargs, output_format)
+            merged_aug_parameters.append(dict(aug_config, kwargs=kwargs))
+        augmentation_chains.append(merged_aug_parameters)
+    return augmentation_chains
+
+
+def get_task_status(task_id):
+    """
+    :param task_id: id returned when the task is started
+    :return: progress dictionary of the task or None if the task is unknown
+    """
+    tracker = get_worker_pool().get_task(task_id)
+    return tracker.to_dict() if tracker else None
+
+
+def get_all_task_status():
+    """
+    :return: list of the progress dictionary of every task
+    """
+    return [tracker.to_dict() for tracker in get_worker_pool().list_tasks()]
+
+
+def crawl_dir(source_directory, image_type=None, scanner=None):
+    """
+    :description: This function is to crawl the given directory and return a generator of the images, the
+    directories are scanned in parallel and the images are streamed as soon as they are found
     :param source_directory: Directory to crawl and find out all the images
+    :param image_type: list of image types to keep i.e ["jpg", "png"], jpeg and png if not given
+    :param scanner: optional DirectoryScanner to use, i.e one with a listing cache
     :return: Generator of the image's absolute path
     """
-    for root_dir, dirs, files in os.walk(source_directory):
-        for file in files:
-            if file.endswith('.jpeg') or file.endswith('.png'):
-                file_absolute_path = os.path.join(os.path.abspath(root_dir), file)
-                yield file_absolute_path
+    scanner = scanner or DirectoryScanner(image_type)
+    return scanner.scan(source_directory)
 
 
-def handle_task(name, augmentations, train_test_split=None, input_image_size=None):
+def handle_task(name, augmentations, train_test_split=None, input_image_size=None, resize=None, task_id=None):
     """
     :description: This function will merge the user input with the configuration and create a job ticket for
-    each images and then worker will further process the images. For this project I am directly sending the
-    request to worker in production it should go to a message queue and and worker should consume it from a queue
-    this way we can achieve high level of parallelism.
+    each images with all the augmentation chains, so the image is decoded only once, and put it on the job queue
+    of the worker pool, the worker processes consume the tickets from the queue. Submitting blocks while the queue
+    is full, after the last ticket it waits until the task is finished. For an incremental data source the frames
+    whose outputs are already recorded in the manifest with the same parameters are skipped, the incremental mode
+    only applies to the jpeg output format.
     :param name: Name of the task it's going to handle.
     :param augmentations: List of dictionary containing the augmentation details.
     :param train_test_split: Dictionary of train test split ratio.
     :param input_image_size: If provided it will resize the images as per this parameter else it will consider
     the size of the raw images.
-    :return: Create a job ticket and submit it to worker to process them images.
+    :param resize: Optional resize options i.e {"filter": "bilinear", "draft": true}.
+    :param task_id: Id of the task, generated if not given.
+    :return: Create a job ticket and submit it to worker pool to process them images.
     """
+    task_id = task_id or uuid.uuid4().hex
+    worker_pool = get_worker_pool()
+    tracker = worker_pool.get_task(task_id) or worker_pool.register_task(task_id, name)
     conf = ConfigurationManager('dev')
-    data_source = conf.get_data_source(name)
-    source_dirs = data_source['source_dir']
-    target_dir = data_source['target_dir']
-    for source_dir in source_dirs:
-        for file in crawl_dir(source_dir):
-            for aug in augmentations:
-                merged_aug_parameters = []
-                for aug_type in list(aug.keys()):
-                    aug_parameters = conf.get_aug_parameters(aug_type)
-                    aug_parameters['kwargs'] = aug[aug_type]
-                    merged_aug_parameters.append(aug_parameters)
+    manifest = None
+    try:
+        data_source = conf.get_data_source(name)
+        source_dirs = data_source['source_dir']
+        target_dir = data_source['target_dir']
+        output = dict(data_source.get('output', {}))
+        augmentation_chains = get_augmentation_chains(conf, augmentations, output.get('format', 'jpeg'))
+        params_hash = get_params_hash(augmentation_chains=augmentation_chains, train_test_split=train_test_split,
+                                      input_image_size=input_image_size, resize=resize, output=output)
+        incremental = data_source.get('incremental')
+        if incremental and output.get('format', 'jpeg') != 'jpeg':
+            logger.info("Incremental mode of {0} is turned off, a job is reported before the {1} shard holding its "
+                        "images is written so it can't be recorded in the manifest".format(name, output['format']))
+            incremental = False
+        if incremental:
+            manifest = TaskManifest(os.path.join(target_dir, MANIFEST_FILE_NAME))
+            tracker.add_listener(manifest.on_job_finished)
+        listing_cache = os.path.join(target_dir, LISTING_CACHE_FILE_NAME) if data_source.get('listing_cache') else None
+        scanner = DirectoryScanner(data_source.get('image_type'), data_source.get('scan_threads', DEFAULT_SCAN_THREADS),
+                                   listing_cache)
+        for source_dir in source_dirs:
+            for file in crawl_dir(source_dir, scanner=scanner):
+                tracker.image_discovered()
+                content_hash = manifest.get_content_hash(file) if manifest else None
+                if manifest and manifest.is_done(content_hash, params_hash):
+                    tracker.image_skipped()
+                    continue
                 job_ticket = {
                     "display_name": name,
                     "file": file,
                     "target_dir": target_dir,
-                    "augmentations": merged_aug_parameters,
+                    "augmentation_chains": augmentation_chains,
                     "train_test_split": train_test_split,
-                    "input_image_size": input_image_size
+                    "input_image_size": input_image_size,
+                    "resize": resize,
+                    "output": output,
+                    "content_hash": content_hash,
+                    "params_hash": params_hash
                 }
-                execute_job(job_ticket)
-    logger.info("Done Task {0}".format(name))
+                worker_pool.submit(task_id, job_ticket)
+    except Exception as e:
+        logger.error("Failed to submit the jobs of task {0}".format(name))
+        logger.error(str(e))
+        tracker.fail(str(e))
+    finally:
+        tracker.close_submission()
+    while not tracker.wait(PROGRESS_LOG_INTERVAL_SEC):
+        progress = tracker.to_dict()
+        logger.info("Progress Task {0} :: {1}/{2} jobs finished, {3} jobs failed, {4} images written, {5} images "
+                    "failed, {6} images/sec, ETA {7} sec"
+                    .format(name, progress['jobs_done'] + progress['jobs_failed'], progress['jobs_queued'],
+                            progress['jobs_failed'], progress['images_written'], progress['images_failed'],
+                            progress['throughput_images_per_sec'], progress['eta_sec']))
+    if manifest:
+        manifest.close()
+    logger.info("Done Task {0} :: {1}".format(name, tracker.to_dict()))
 
 
 if __name__ == '__main__':
@@ -92,4 +279,5 @@ if __name__ == '__main__':
                 ]
             }
         ]
-    start_task(user_req)
+    for user_task in user_req:
+        handle_task(**user_task)
@@ -0,0 +1,60 @@
+from dataset_split import get_split_ratios, assign_split, split_by_ratios, TRAIN, TEST, VALIDATION
+from collections import Counter
+import pytest
+
+KEYS = ['frame_{0}.jpeg'.format(index) for index in range(2000)]
+
+
+def test_assignment_is_deterministic():
+    split_ratio = {"train_ratio": 70, "test_ratio": 20}
+    assert [assign_split(key, split_ratio) for key in KEYS] == [assign_split(key, dict(split_ratio)) for key in KEYS]
+
+
+def test_seed_reshuffles_the_assignment():
+    first = [assign_split(key, {"train_ratio": 50, "seed": 1}) for key in KEYS]
+    second = [assign_split(key, {"train_ratio": 50, "seed": 2}) for key in KEYS]
+    assert first != second
+
+
+def test_assignment_follows_the_ratios():
+    counts = Counter(assign_split(key, {"train_ratio": 60, "test_ratio": 30, "validation_ratio": 10}) for key in KEYS)
+    assert abs(counts[TRAIN] / len(KEYS) - 0.6) < 0.05
+    assert abs(counts[TEST] / len(KEYS) - 0.3) < 0.05
+    assert abs(counts[VALIDATION] / len(KEYS) - 0.1) < 0.05
+
+
+@pytest.mark.parametrize('split_ratio', [None, {}, {"train_ratio": 0}, {"train_ratio": None, "test_ratio": 50}])
+def test_data_set_without_train_ratio_is_not_split(split_ratio):
+    assert assign_split('a.jpeg', split_ratio) is None
+
+
+@pytest.mark.parametrize('ratios, expected', [((100, 0, 0), TRAIN), ((0, 100, 0), TEST), ((0, 0, 100), VALIDATION)])
+def test_single_split_takes_every_frame(ratios, expected):
+    assert {split_by_ratios(key, ratios) for key in KEYS} == {expected}
+
+
+def test_ratios_under_100_are_rescaled():
+    assert {split_by_ratios(key, (0, 30, 0)) for key in KEYS} == {TEST}
+    assert {split_by_ratios(key, (40, 40, 0)) for key in KEYS} == {TRAIN, TEST}
+
+
+@pytest.mark.parametrize('split_ratio, expected', [
+    ({"train_ratio": 80}, (80, 20, 0)),
+    ({"train_ratio": 70, "test_ratio": 20}, (70, 20, 10)),
+    ({"train_ratio": 60, "test_ratio": 20, "validation_ratio": 10}, (60, 20, 10)),
+    ({"train_ratio": 100}, (100, 0, 0))
+])
+def test_default_ratios(split_ratio, expected):
+    assert get_split_ratios(split_ratio) == expected
+
+
+@pytest.mark.parametrize('split_ratio', [
+    {"train_ratio": 80, "test_ratio": 30},
+    {"train_ratio": 50, "test_ratio": 30, "validation_ratio": 30},
+    {"train_ratio": -10},
+    {"train_ratio": 50, "test_ratio": -10},
+    {"train_ratio": 120}
+])
+def test_invalid_ratios_are_rejected(split_ratio):
+    with pytest.raises(ValueError):
+        get_split_ratios(split_ratio)
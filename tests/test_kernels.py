@@ -0,0 +1,79 @@
+from modules.kernels import fuse, flip, rot90
+import numpy as np
+import pytest
+
+
+def brightness_step(images, delta):
+    return np.clip(np.rint(images.astype(np.float64) + delta), 0, 255)
+
+
+def contrast_step(images, factor):
+    gray_mean = images.astype(np.float64).mean(axis=(-3, -2, -1), keepdims=True)
+    return np.clip(np.rint(factor * images + (1 - factor) * gray_mean), 0, 255)
+
+
+def normalize_step(images, mean, std):
+    return ((images - np.asarray(mean, dtype=np.float64)) / np.asarray(std, dtype=np.float64)).astype(np.float32)
+
+
+def random_images(dtype, shape=(3, 7, 5, 3)):
+    images = np.random.default_rng(0).integers(0, 256, size=shape)
+    return images.astype(dtype)
+
+
+@pytest.mark.parametrize('delta, factor', [(20, 1.5), (-40, 0.5), (255, 2.0), (-255, 2.0)])
+def test_uint8_chain_matches_the_ops_applied_one_by_one(delta, factor):
+    images = random_images(np.uint8)
+    expected = contrast_step(brightness_step(rot90(flip(images, 'horizontal')), delta), factor).astype(np.uint8)
+    kernel = fuse([{"name": "flip", "mode": "horizontal"}, {"name": "brightness", "delta": delta},
+                   {"name": "rot90", "k": 1}, {"name": "contrast", "factor": factor}])
+    result = kernel(images)
+    assert result.dtype == np.uint8
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_uint8_chain_ending_with_normalize_matches_the_ops_applied_one_by_one():
+    images = random_images(np.uint8)
+    mean, std = [120.0, 110.0, 100.0], [60.0, 50.0, 40.0]
+    expected = normalize_step(contrast_step(brightness_step(flip(images, 'both'), 30), 1.2), mean, std)
+    kernel = fuse([{"name": "brightness", "delta": 30}, {"name": "contrast", "factor": 1.2},
+                   {"name": "flip", "mode": "both"}, {"name": "normalize", "mean": mean, "std": std}])
+    result = kernel(images)
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, expected, rtol=1e-6)
+
+
+def test_single_image_keeps_its_rank():
+    image = random_images(np.uint8, shape=(7, 5, 3))
+    result = fuse([{"name": "rot90"}, {"name": "brightness", "delta": 10}])(image)
+    np.testing.assert_array_equal(result, brightness_step(rot90(image), 10).astype(np.uint8))
+
+
+@pytest.mark.parametrize('delta, factor', [(20.5, 1.5), (255, 2.0)])
+def test_float_chain_matches_the_ops_applied_one_by_one(delta, factor):
+    images = random_images(np.float32) + 0.25
+    brightened = np.clip(flip(images, 'vertical').astype(np.float64) + delta, 0, 255)
+    gray_mean = brightened.mean(axis=(1, 2, 3), keepdims=True)
+    expected = np.clip(factor * brightened + (1 - factor) * gray_mean, 0, 255)
+    kernel = fuse([{"name": "flip", "mode": "vertical"}, {"name": "brightness", "delta": delta},
+                   {"name": "contrast", "factor": factor}, {"name": "normalize", "mean": 0.0, "std": 255.0}])
+    result = kernel(images)
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, (expected / 255.0).astype(np.float32), rtol=1e-6)
+
+
+def test_jitter_is_reproducible_with_a_seed():
+    images = random_images(np.uint8)
+    ops = [{"name": "brightness", "delta_range": [-50, 50]}, {"name": "contrast", "factor_range": [0.5, 1.5]}]
+    np.testing.assert_array_equal(fuse(ops, seed=7)(images), fuse(ops, seed=7)(images))
+
+
+@pytest.mark.parametrize('ops', [
+    [{"name": "normalize", "mean": 0, "std": 1}, {"name": "brightness", "delta": 1}],
+    [{"name": "flip", "mode": "diagonal"}],
+    [{"name": "blur"}],
+    ["flip"]
+])
+def test_invalid_chains_are_rejected(ops):
+    with pytest.raises(ValueError):
+        fuse(ops)
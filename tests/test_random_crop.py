@@ -0,0 +1,45 @@
+from modules.random_crop import RandomCropSampler, get_random_origins, image_random_cropping_batch
+import numpy as np
+import pytest
+
+
+def overlaps(first, second, crop_dy, crop_dx):
+    return abs(first[0] - second[0]) < crop_dy and abs(first[1] - second[1]) < crop_dx
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_origins_fit_in_the_image_and_never_overlap(seed):
+    height, width, crop_dy, crop_dx = 60, 50, 12, 9
+    assert len(get_random_origins(height, width, crop_dy, crop_dx, 5, seed)) == 5
+    origins = get_random_origins(height, width, crop_dy, crop_dx, 40, seed)
+    assert 5 < len(origins) < 40
+    for index, (y, x) in enumerate(origins):
+        assert 0 <= y <= height - crop_dy and 0 <= x <= width - crop_dx
+        assert not any(overlaps((y, x), other, crop_dy, crop_dx) for other in origins[:index])
+
+
+def test_origins_are_reproducible_with_a_seed():
+    assert get_random_origins(270, 270, 80, 80, 3, 11) == get_random_origins(270, 270, 80, 80, 3, 11)
+    assert get_random_origins(270, 270, 80, 80, 3, 11) != get_random_origins(270, 270, 80, 80, 3, 12)
+
+
+def test_sampler_stops_when_no_crop_fits():
+    sampler = RandomCropSampler(20, 20, 10, 10, seed=0)
+    origins = []
+    origin = sampler.sample()
+    while origin is not None:
+        origins.append(origin)
+        origin = sampler.sample()
+    assert 1 <= len(origins) <= 4
+    assert sampler.free_count == 0 and not sampler.free.any()
+    assert RandomCropSampler(5, 5, 10, 10).sample() is None
+
+
+def test_batch_crops_match_the_origins():
+    images = np.random.default_rng(0).integers(0, 256, size=(2, 40, 30, 3)).astype(np.uint8)
+    crops, prefixes = image_random_cropping_batch(images, [8, 6], 3, seed=4)
+    assert crops.shape == (2, 3, 8, 6, 3) and len(prefixes) == 3
+    rng = np.random.default_rng(4)
+    for n in range(2):
+        for index, (y, x) in enumerate(get_random_origins(40, 30, 8, 6, 3, rng)):
+            np.testing.assert_array_equal(crops[n, index], images[n, y:y + 8, x:x + 6, :])
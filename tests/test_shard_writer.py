@@ -0,0 +1,29 @@
+from shard_writer import NpyShardWriter, ShardReceipt
+import numpy as np
+import json
+import os
+
+
+def test_receipt_is_complete_once_the_shard_is_written(tmp_path):
+    writer = NpyShardWriter(str(tmp_path), shard_size=3)
+    first_job, second_job = ShardReceipt(), ShardReceipt()
+    for index in range(2):
+        writer.append('train', np.full((2, 2, 3), index, dtype=np.uint8), 'a{0}.jpeg'.format(index), first_job)
+    assert not first_job.complete
+    writer.append('train', np.zeros((2, 2, 3), dtype=np.uint8), 'b0.jpeg', second_job)
+    writer.append('train', np.zeros((2, 2, 3), dtype=np.uint8), 'b1.jpeg', second_job)
+    assert first_job.complete and not second_job.complete
+    writer.flush()
+    assert second_job.complete and second_job.written == 2 and not second_job.failed
+    with open(os.path.join(str(tmp_path), 'train', 'index-{0}.jsonl'.format(writer.writer_id))) as f:
+        assert [json.loads(line)['name'] for line in f] == ['a0.jpeg', 'a1.jpeg', 'b0.jpeg', 'b1.jpeg']
+
+
+def test_receipt_counts_the_images_of_a_shard_which_failed(tmp_path):
+    target_file = tmp_path / 'not_a_directory'
+    target_file.write_text('')
+    writer = NpyShardWriter(str(target_file), shard_size=2)
+    receipt = ShardReceipt()
+    writer.append(None, np.zeros((2, 2, 3), dtype=np.float32), 'a.jpeg', receipt)
+    writer.flush()
+    assert receipt.complete and receipt.failed == 1 and receipt.written == 0
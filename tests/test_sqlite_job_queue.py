@@ -0,0 +1,188 @@
+from job_queue import SqliteJobQueue, run_worker
+import pytest
+import sqlite3
+import queue
+import time
+import os
+
+VISIBILITY_TIMEOUT_SEC = 0.3
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / 'queue.sqlite3')
+
+
+def make_queue(queue_path, **kwargs):
+    options = dict(queue_size=10, visibility_timeout_sec=VISIBILITY_TIMEOUT_SEC, max_attempts=2, retry_delay_sec=0)
+    options.update(kwargs)
+    return SqliteJobQueue(queue_path, **options)
+
+
+def make_ticket(name):
+    return {"task_id": "task", "file": name, "content_hash": name, "params_hash": "params"}
+
+
+def done_report(job_ticket):
+    return {"task_id": job_ticket['task_id'], "status": "done", "images_written": 1}
+
+
+def failed_report(job_ticket, retryable=True):
+    return {"task_id": job_ticket['task_id'], "status": "failed", "images_written": 0, "error": "boom",
+            "retryable": retryable}
+
+
+def test_done_job_is_reported_and_removed(queue_path):
+    job_queue = make_queue(queue_path)
+    job_queue.put(make_ticket('a.jpeg'))
+    job_ticket = job_queue.get(timeout=1)
+    assert job_ticket['file'] == 'a.jpeg'
+    job_queue.task_done(job_ticket, done_report(job_ticket))
+    assert job_queue.get_report(timeout=1)['status'] == 'done'
+    assert job_queue._connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
+    with pytest.raises(queue.Empty):
+        job_queue.get(timeout=0.2)
+
+
+def test_leased_ticket_is_invisible_until_the_lease_expires(queue_path):
+    job_queue = make_queue(queue_path)
+    job_queue.put(make_ticket('a.jpeg'))
+    first_lease = job_queue.get(timeout=1)
+    with pytest.raises(queue.Empty):
+        job_queue.get(timeout=0.1)
+    time.sleep(VISIBILITY_TIMEOUT_SEC)
+    second_lease = job_queue.get(timeout=1)
+    assert second_lease['job_id'] == first_lease['job_id']
+    assert second_lease['lease_id'] != first_lease['lease_id']
+
+    job_queue.task_done(first_lease, done_report(first_lease))
+    with pytest.raises(queue.Empty):
+        job_queue.get_report(timeout=0.2)
+    job_queue.task_done(second_lease, done_report(second_lease))
+    assert job_queue.get_report(timeout=1)['status'] == 'done'
+
+
+def test_failed_job_is_retried_then_dead_lettered(queue_path):
+    job_queue = make_queue(queue_path)
+    job_queue.put(make_ticket('a.jpeg'))
+    job_ticket = job_queue.get(timeout=1)
+    job_queue.task_done(job_ticket, failed_report(job_ticket))
+    with pytest.raises(queue.Empty):
+        job_queue.get_report(timeout=0.2)
+
+    job_ticket = job_queue.get(timeout=1)
+    job_queue.task_done(job_ticket, failed_report(job_ticket))
+    report = job_queue.get_report(timeout=1)
+    assert report['status'] == 'failed'
+    assert report['dead_lettered']
+    dead_letters = job_queue.get_dead_letters()
+    assert [(job['file'], job['attempts'], job['error']) for job in dead_letters] == [('a.jpeg', 2, 'boom')]
+    with pytest.raises(queue.Empty):
+        job_queue.get(timeout=0.2)
+
+
+def test_corrupt_frame_is_dead_lettered_without_retry(queue_path):
+    job_queue = make_queue(queue_path)
+    job_queue.put(make_ticket('corrupt.jpeg'))
+    job_ticket = job_queue.get(timeout=1)
+    job_queue.task_done(job_ticket, failed_report(job_ticket, retryable=False))
+    assert job_queue.get_report(timeout=1)['dead_lettered']
+    assert job_queue.get_dead_letters()[0]['attempts'] == 1
+
+
+def test_expired_lease_is_dead_lettered_after_max_attempts(queue_path):
+    job_queue = make_queue(queue_path)
+    job_queue.put(make_ticket('hangs.jpeg'))
+    for _ in range(2):
+        job_queue.get(timeout=1)
+        time.sleep(VISIBILITY_TIMEOUT_SEC)
+    with pytest.raises(queue.Empty):
+        job_queue.get(timeout=0.2)
+    report = job_queue.get_report(timeout=1)
+    assert report['dead_lettered']
+    assert report['content_hash'] == 'hangs.jpeg'
+    assert report['error'] == 'Lease expired 2 times'
+
+
+def test_put_blocks_while_the_queue_is_full(queue_path):
+    job_queue = make_queue(queue_path, queue_size=2)
+    job_queue.put(make_ticket('a.jpeg'))
+    job_queue.put(make_ticket('b.jpeg'))
+    with pytest.raises(queue.Full):
+        job_queue.put(make_ticket('c.jpeg'), timeout=0.2)
+    job_ticket = job_queue.get(timeout=1)
+    with pytest.raises(queue.Full):
+        job_queue.put(make_ticket('c.jpeg'), timeout=0.2)
+    job_queue.task_done(job_ticket, done_report(job_ticket))
+    job_queue.put(make_ticket('c.jpeg'), timeout=1)
+
+
+def test_stop_markers_are_taken_by_their_stop_group_after_the_queued_tickets(queue_path):
+    pool_queue = make_queue(queue_path, stop_group='pool')
+    other_queue = make_queue(queue_path, stop_group='other')
+    pool_queue.put(make_ticket('a.jpeg'))
+    pool_queue.stop_workers(1)
+    job_ticket = pool_queue.get(timeout=1)
+    assert job_ticket['file'] == 'a.jpeg'
+    pool_queue.task_done(job_ticket, done_report(job_ticket))
+    with pytest.raises(queue.Empty):
+        other_queue.get(timeout=0.2)
+    assert pool_queue.get(timeout=1) is None
+    with pytest.raises(queue.Empty):
+        pool_queue.get(timeout=0.2)
+
+
+def test_reports_go_to_the_stop_group_which_put_the_ticket(queue_path):
+    first_pool = make_queue(queue_path, stop_group='first')
+    second_pool = make_queue(queue_path, stop_group='second')
+    standalone_worker = make_queue(queue_path, stop_group='standalone')
+    first_pool.put(dict(make_ticket('a.jpeg'), task_id='first-task'))
+    second_pool.put(dict(make_ticket('b.jpeg'), task_id='second-task'))
+    for _ in range(2):
+        job_ticket = standalone_worker.get(timeout=1)
+        standalone_worker.task_done(job_ticket, done_report(job_ticket))
+    with pytest.raises(queue.Empty):
+        standalone_worker.get_report(timeout=0.2)
+
+    second_pool.stop_reports()
+    assert first_pool.get_report(timeout=1)['task_id'] == 'first-task'
+    with pytest.raises(queue.Empty):
+        first_pool.get_report(timeout=0.2)
+    assert second_pool.get_report(timeout=1)['task_id'] == 'second-task'
+    assert second_pool.get_report(timeout=1) is None
+
+
+def test_reports_table_without_stop_group_is_migrated(queue_path):
+    conn = sqlite3.connect(queue_path)
+    conn.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY AUTOINCREMENT, report TEXT)")
+    conn.commit()
+    conn.close()
+    job_queue = make_queue(queue_path)
+    job_queue.stop_reports()
+    assert job_queue.get_report(timeout=1) is None
+
+
+def run_jobs(job_queue, tmp_path, files):
+    for file_path in files:
+        job_queue.put(dict(make_ticket(os.path.basename(file_path)), file=file_path, target_dir=str(tmp_path / 'out'),
+                           display_name='test', input_image_size=None, train_test_split=None,
+                           augmentation_chains=[]))
+    run_worker(job_queue, decode_threads=0, writer_threads=0, shard_flush_idle_sec=0.1, max_idle_sec=0.3)
+    reports = {}
+    while True:
+        try:
+            report = job_queue.get_report(timeout=0.2)
+        except queue.Empty:
+            return reports
+        reports[report['content_hash']] = report
+
+
+def test_unreadable_frame_is_retried_and_corrupt_frame_is_not(queue_path, tmp_path):
+    corrupt_path = tmp_path / 'corrupt.jpeg'
+    corrupt_path.write_bytes(b'not a jpeg')
+    job_queue = make_queue(queue_path)
+    reports = run_jobs(job_queue, tmp_path, [str(corrupt_path), str(tmp_path / 'missing.jpeg')])
+    assert reports['corrupt.jpeg']['dead_lettered']
+    assert reports['missing.jpeg']['dead_lettered']
+    attempts = {job['file']: job['attempts'] for job in job_queue.get_dead_letters()}
+    assert attempts == {str(corrupt_path): 1, str(tmp_path / 'missing.jpeg'): 2}
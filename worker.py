@@ -1,162 +1,384 @@
 import importlib
-from tensorflow.keras.preprocessing import image
+from collections import OrderedDict
+from functools import lru_cache
 from log_manager import get_logger
+from shard_writer import get_shard_writer
+from image_io import get_image_io
+from metrics import get_metrics
+from modules.registry import get_augmentation
+from dataset_split import assign_split, get_split_ratios, split_by_ratios, TRAIN, TEST, VALIDATION
+from scanner import DirectoryScanner
 import os
-import random
+import hashlib
+import threading
+import time
 import numpy as np
+from PIL import UnidentifiedImageError
 
 logger = get_logger()
 
 
-def execute_job(job_ticket):
+class CorruptImageError(ValueError):
     """
+    The source frame of a job can't be decoded, retrying the job can't succeed. An I/O error while reading the
+    frame is raised as an OSError instead, i.e an EIO or ESTALE of a network file system, and the job is retried
+    """
+
+
+class DecodedImageCache:
+    """
+    Bounded LRU cache of decoded image arrays keyed by (path, mtime, input_image_size, resize), a changed file gets
+    a new key so stale arrays are never served. The cached arrays are read only as they are shared by every
+    augmentation. With a cache directory the decoded uint8 arrays are also stored as .npy files and memory mapped on
+    later hits, so repeated runs and other worker processes skip the JPEG decode without holding a private copy.
+    """
+    def __init__(self, max_size=0, cache_dir=None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self._arrays = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_image_array(self, path, input_image_size=None, resize=None):
+        """
+        :param path: image path
+        :param input_image_size: size the image is resized to
+        :param resize: resize options of get_image_array
+        :return: the decoded image array, from the cache if present
+        """
+        if not self.max_size and not self.cache_dir:
+            return get_image_array(path, input_image_size, resize)
+        try:
+            key = (path, os.stat(path).st_mtime_ns, tuple(input_image_size) if input_image_size else None,
+                   tuple(sorted(resize.items())) if resize else None)
+        except OSError:
+            return get_image_array(path, input_image_size, resize)
+        with self._lock:
+            if key in self._arrays:
+                self._arrays.move_to_end(key)
+                return self._arrays[key]
+        image_array = self._load_decoded(key)
+        if image_array is None:
+            image_array = get_image_array(path, input_image_size, resize)
+            if image_array is not None and self.cache_dir:
+                self._store_decoded(key, image_array)
+        if image_array is not None and self.max_size:
+            image_array.setflags(write=False)
+            with self._lock:
+                self._arrays[key] = image_array
+                while len(self._arrays) > self.max_size:
+                    self._arrays.popitem(last=False)
+        return image_array
+
+    def _decoded_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.npy')
+
+    def _load_decoded(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            return np.load(self._decoded_path(key), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error("Failed to read the decoded image cache {0}".format(self._decoded_path(key)))
+            logger.error(str(e))
+            return None
+
+    def _store_decoded(self, key, image_array):
+        decoded_path = self._decoded_path(key)
+        temp_path = '{0}.{1}.tmp.npy'.format(decoded_path[:-4], os.getpid())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.save(temp_path, image_array)
+            os.replace(temp_path, decoded_path)
+        except Exception as e:
+            logger.error("Failed to write the decoded image cache {0}".format(decoded_path))
+            logger.error(str(e))
+
+
+decoded_image_cache = DecodedImageCache()
+
+
+def set_decode_cache_size(max_size, cache_dir=None):
+    """
+    :param max_size: number of decoded images kept by this worker process, 0 disables the cache
+    :param cache_dir: optional directory of memory mapped decoded images shared by the worker processes
+    """
+    global decoded_image_cache
+    decoded_image_cache = DecodedImageCache(max_size, cache_dir)
+
+
+def load_job_image(job_ticket):
+    """
+    :param job_ticket: job ticket of the image
+    :return: the decoded and resized image array of the job ticket, raises CorruptImageError or OSError, see
+    get_image_array
+    """
+    with get_metrics().timer('decode_seconds'):
+        return decoded_image_cache.get_image_array(job_ticket['file'], job_ticket['input_image_size'],
+                                                   job_ticket.get('resize'))
+
+
+def execute_job(job_ticket, image_array=None, image_writer=None, receipt=None):
+    """
+    :description: The image is decoded once and the same array is shared by every augmentation chain of the ticket
     :param job_ticket: job_ticket received from task manager, In production worker should take the job ticket
     from a message queue.
-    :return:
+    :param image_array: already decoded image of the job ticket i.e by the prefetch stage, decoded here if None
+    :param image_writer: optional AsyncImageWriter which saves the images in the background
+    :param receipt: optional ShardReceipt counting the images of the job appended to the shard writers
+    :return: job report with the number and the names of the images written, the job is failed if an augmentation
+    raised or an image couldn't be saved
     """
     file_path = job_ticket['file']
+    if image_array is None:
+        image_array = load_job_image(job_ticket)
+    if image_array is None:
+        raise CorruptImageError("Failed to load the image {0}".format(file_path))
+    outputs = []
+    stage_outputs = {}
+    failures = {"augmentation_failures": 0, "save_failures": 0, "errors": []}
+    with get_metrics().timer('job_seconds'):
+        for augmentations in job_ticket['augmentation_chains']:
+            outputs.extend(execute_augmentation_chain(job_ticket, image_array, augmentations, stage_outputs,
+                                                      image_writer, failures, receipt))
+    report = {"images_written": len(outputs), "stage_outputs": stage_outputs, "outputs": outputs,
+              "augmentation_failures": failures['augmentation_failures'], "save_failures": failures['save_failures']}
+    if failures['errors']:
+        report.update(status='failed', error='; '.join(failures['errors']), retryable=True)
+    return report
+
+
+def execute_augmentation_chain(job_ticket, image_array, augmentations, stage_outputs=None, image_writer=None,
+                               failures=None, receipt=None):
+    """
+    :param job_ticket: job ticket the chain belongs to
+    :param image_array: decoded source image
+    :param augmentations: list of augmentation parameters to apply, each stage works on the outputs of the
+    previous stage
+    :param stage_outputs: optional dictionary which counts the images produced per augmentation name
+    :param image_writer: optional AsyncImageWriter, the chain waits for its pending writes before returning
+    :param failures: optional dictionary counting the augmentation_failures and save_failures with the list of
+    the errors, without it a failed augmentation raises and a failed save is only left out of the names
+    :param receipt: optional ShardReceipt of the job given to the shard writers
+    :return: list of the names of the images written
+    """
     target_dir = job_ticket['target_dir']
     display_name = job_ticket['display_name']
-    file_name = os.path.split(file_path)[1]
-    augmentations = job_ticket['augmentations']
-    image_array = get_image_array(file_path, job_ticket['input_image_size'])
-    total_number_of_job = len(augmentations)
-    for image_array, prefix in do_augmentation(display_name, image_array, augmentations[0]):
-        save_image_to_train_test(image_array, target_dir, prefix + '_' + file_name, job_ticket['train_test_split'])
-        if total_number_of_job >= 2:
-            for sec_aug_img, sec_prefix in do_augmentation(display_name, image_array, augmentations[1]):
-                save_image_to_train_test(sec_aug_img, target_dir, sec_prefix + '_' + file_name,
-                                         job_ticket['train_test_split'])
-        if total_number_of_job >= 3:
-            for thd_aug_img, thd_prefix in do_augmentation(display_name, image_array, augmentations[2]):
-                save_image_to_train_test(thd_aug_img, target_dir, thd_prefix + '_' + file_name,
-                                         job_ticket['train_test_split'])
-
-
-def do_train_test_split(source_dir, train_ratio, test_ratio):
-    """
-    :description: This is a placeholder function to do train test split after augmentation
+    file_name = os.path.split(job_ticket['file'])[1]
+    saved = []
+    augmentation_error = None
+    try:
+        for stage, aug_img, prefix in run_pipeline(display_name, image_array, augmentations):
+            if stage_outputs is not None:
+                aug_type = augmentations[stage]['name']
+                stage_outputs[aug_type] = stage_outputs.get(aug_type, 0) + 1
+            target_file_name = prefix + '_' + file_name
+            save_args = (aug_img, target_dir, target_file_name, job_ticket['train_test_split'],
+                         job_ticket.get('output'), file_name, receipt)
+            if image_writer:
+                saved.append((target_file_name, image_writer.submit(save_image_to_train_test, *save_args)))
+            else:
+                saved.append((target_file_name, save_image_to_train_test(*save_args)))
+    except Exception as e:
+        if failures is None:
+            raise
+        augmentation_error = e
+    written = []
+    for target_file_name, result in saved:
+        if result.result() if image_writer else result:
+            written.append(target_file_name)
+        elif failures is not None:
+            failures['save_failures'] += 1
+            failures['errors'].append("Failed to save {0}".format(target_file_name))
+    if augmentation_error is not None:
+        failures['augmentation_failures'] += 1
+        failures['errors'].append(str(augmentation_error))
+    return written
+
+
+def run_pipeline(display_name, image_array, augmentations, stage=0):
+    """
+    :description: Lazily evaluate the augmentation stages as a tree, depth first. Every output of a stage is
+    yielded and then fed to the next stage before the following output is computed, so an intermediate array is
+    computed once and released as soon as its branch is done.
+    :param display_name: Name of the Job i.e MotoGp
+    :param image_array: input image array of the stage
+    :param augmentations: list of augmentation parameters, one per stage
+    :param stage: index of the stage to evaluate
+    :return: Generator of the stage index, augmented image array and prefix
+    """
+    if stage >= len(augmentations):
+        return
+    for aug_img, prefix in do_augmentation(display_name, image_array, augmentations[stage]):
+        yield stage, aug_img, prefix
+        yield from run_pipeline(display_name, aug_img, augmentations, stage + 1)
+
+
+def do_train_test_split(source_dir, train_ratio, test_ratio, image_type=None):
+    """
+    :description: Split the images of a directory with the deterministic hash splitter, each file is assigned by
+    the hash of its name so the result doesn't depend on the order or the number of files. A zero train ratio puts
+    every file in the test and validation sets.
     :param source_dir: directory where imagaes are located
-    :param train_ratio: train ratio
-    :param test_ratio: test ratio
+    :param train_ratio: train ratio in percent
+    :param test_ratio: test ratio in percent, the rest goes to validation
+    :param image_type: list of image types to keep i.e ["jpg", "png"], jpeg and png if not given
     :return: list of train, test and validation image set
     """
-    file_list = []
-    validation = []
-    for root_dir, dirs, files in os.walk(source_dir):
-        file_list.extend([os.path.join(os.path.abspath(root_dir), file) for file in files if file.endswith('.jpeg')
-                          or file.endswith('.png')])
-    train = random.sample(file_list, int(len(file_list) * test_ratio/100))
-    rest = [x for x in file_list if x not in train]
-    if train_ratio + test_ratio == 1:
+    splits = {TRAIN: [], TEST: [], VALIDATION: []}
+    ratios = get_split_ratios({"train_ratio": train_ratio, "test_ratio": test_ratio})
+    for file_path in sorted(DirectoryScanner(image_type).scan(source_dir)):
+        splits[split_by_ratios(os.path.basename(file_path), ratios)].append(file_path)
+    if not splits[VALIDATION]:
         logger.info("No validation set required")
-        test = rest
-    else:
-        test = random.sample(rest, int(len(file_list) * test_ratio/100))
-        validation = [x for x in rest if x not in test]
-    return train, test, validation
+    return splits[TRAIN], splits[TEST], splits[VALIDATION]
+
+
+@lru_cache(maxsize=None)
+def resolve_function(module_name, function_name):
+    """
+    :description: Import the module of the modules package and look up the function, resolved once per process
+    :param module_name: name of the module i.e crop
+    :param function_name: name of the function i.e image_cropping
+    :return: the function object
+    """
+    module_obj = importlib.import_module('.' + module_name, package='modules')
+    return getattr(module_obj, function_name)
 
 
 def do_augmentation(display_name, raw_image, augmentation):
     """
-    :description: This function will import the related module dynamically and execute the function to do
-    the augmentation
+    :description: This function will look up the augmentation in the registry, or import the related module
+    dynamically if it isn't registered, and execute the function to do the augmentation. The optional post processing
+    function of the same module is applied to every augmented image.
     :param display_name: Name of the Job i.e MotoGp
     :param raw_image: image array as a input to do the augmentation
     :param augmentation: dictionary of augmentation parameter i.e type of augmentation , module name, function name etc
-    :return: Generator of the augmented image array and a prefix
+    :return: Generator of the augmented image array and a prefix, an error of the augmentation is logged and raised
     """
     module_name = augmentation['module_name']
     pre_processing_function = augmentation['pre_processing_function']
+    post_processing_function = augmentation.get('post_processing_function')
     kwargs = augmentation['kwargs']
     aug_type = augmentation['name']
+    metrics = get_metrics()
     try:
-        module_obj = importlib.import_module('.' + module_name, package='modules')
-        pre_processing_func = getattr(module_obj, pre_processing_function)
-        logger.info(raw_image.shape)
-        for out_img, prefix in pre_processing_func(raw_image, **kwargs):
+        registered = get_augmentation(aug_type)
+        if registered:
+            pre_processing_func = registered.function
+        else:
+            pre_processing_func = resolve_function(module_name, pre_processing_function)
+        post_processing_func = resolve_function(module_name, post_processing_function) \
+            if post_processing_function else None
+        logger.debug("%s on %s image of shape %s", aug_type, display_name, raw_image.shape)
+        outputs = iter(pre_processing_func(raw_image, **kwargs))
+        while True:
+            start = time.perf_counter()
+            output = next(outputs, None)
+            if output is None:
+                break
+            metrics.observe('augmentation_seconds', time.perf_counter() - start, stage=aug_type)
+            out_img, prefix = output
+            if post_processing_func:
+                out_img = post_processing_func(out_img)
             prefix_str = '_'.join(prefix)
             target_file_name = aug_type + '_' + prefix_str
             yield out_img, target_file_name
     except AttributeError as e:
         logger.error("Failed to import module {0} from {1} package".format(module_name, 'modules'))
         logger.error(str(e))
+        raise
     except Exception as e:
         logger.error("Failed to do {0} on {1} data set".format(aug_type, display_name))
         logger.error(str(e))
+        raise
 
 
-def save_image_to_train_test(raw_image, target_dir, target_file_name, split_ratio=None):
+def save_image_to_train_test(raw_image, target_dir, target_file_name, split_ratio=None, output=None, split_key=None,
+                             receipt=None):
     """
     :param split_ratio:
     :param raw_image: image array to save
     :param target_dir: location where to save the images
     :param target_file_name: name of the images
-    :return:
+    :param output: output config of the data source, loose JPEG files if not given else packed shards
+    :param split_key: name of the source frame, every image of a frame goes to the same split
+    :param receipt: optional ShardReceipt of the job, told when the shard of the image is written
+    :return: True if the image is saved, or buffered by the shard writer of a packed output
     """
-    if split_ratio:
-        train_ratio = split_ratio['train_ratio']
-    else:
-        train_ratio = None
+    target_abs_path = os.path.join(target_dir, target_file_name)
+    output_format = output.get('format', 'jpeg') if output else 'jpeg'
     try:
-        if train_ratio:
-            train_filter = 1 - train_ratio/100
-            if np.random.rand(1) < train_filter:
-                target_dir = os.path.join(target_dir, 'test')
-                target_abs_path = os.path.join(target_dir, target_file_name)
-                save_image(raw_image, target_abs_path)
-            else:
-                target_dir = os.path.join(target_dir, 'train')
-                target_abs_path = os.path.join(target_dir, target_file_name)
-                save_image(raw_image, target_abs_path)
-        else:
-            target_abs_path = os.path.join(target_dir, target_file_name)
-            save_image(raw_image, target_abs_path)
+        with get_metrics().timer('save_seconds', format=output_format):
+            split = assign_split(split_key or target_file_name, split_ratio)
+            if output_format != 'jpeg':
+                return get_shard_writer(target_dir, output).append(split, raw_image, target_file_name, receipt)
+            if split:
+                target_abs_path = os.path.join(target_dir, split, target_file_name)
+            return save_image(raw_image, target_abs_path)
     except Exception as e:
         logger.error("Failed to save images in directory {0}".format(str(target_abs_path)))
         logger.error(str(e))
+        return False
 
 
-def get_image_array(path, input_image_size=None):
+def get_image_array(path, input_image_size=None, resize=None):
     """
     :description: This function take the image path as an input and give image array as a output, image array get
-    resized if input image size is given.
+    resized if input image size is given. The array keeps the uint8 pixels of the decoded image, there is no float
+    conversion. The image is decoded by the image I/O backend of the process, PIL unless TensorFlow is selected.
     :param path: jpeg, png or any other image input path
     :param input_image_size: By default it's none if you provide then images will be resized to the given size
-    :return: Returns the image array
+    :param resize: optional resize options i.e {"filter": "bilinear", "draft": true, "reducing_gap": 2.0}
+    :return: Returns the HxWxC uint8 image array, raises CorruptImageError if the file can't be decoded and
+    OSError if it can't be read
     """
     try:
-        img = image.load_img(path)
-        image_size = img.size
-        if input_image_size:
-            input_size = tuple(input_image_size)
-            if image_size != input_size:
-                img = img.resize(tuple(input_size))
-        img_array = image.img_to_array(img)
-        return img_array
-    except FileNotFoundError:
-        logger.error("Image not found {0}".format(path))
-    except Exception as e:
-        logger.error("Failed to load the image {0}".format(path.rsplit(os.sep, 1)[1]))
+        return get_image_io().load_image(path, input_image_size, resize)
+    except (UnidentifiedImageError, ValueError, SyntaxError) as e:
+        logger.error("Failed to decode the image {0}".format(path.rsplit(os.sep, 1)[1]))
+        logger.error(str(e))
+        raise CorruptImageError("Failed to decode the image {0} :: {1}".format(path, e)) from e
+    except OSError as e:
+        if e.errno is None:
+            # PIL decoders raise OSError without an errno for a truncated or broken data stream
+            logger.error("Failed to decode the image {0}".format(path.rsplit(os.sep, 1)[1]))
+            logger.error(str(e))
+            raise CorruptImageError("Failed to decode the image {0} :: {1}".format(path, e)) from e
+        logger.error("Failed to read the image {0}".format(path))
         logger.error(str(e))
+        raise
+
+
+def write_image_file(img, path):
+    """
+    :description: uint8 arrays are encoded as they are, other arrays are min-max rescaled to 0-255 first
+    :param img: image array
+    :param path: absolute path of the target file
+    """
+    get_image_io().save_image(img, path)
 
 
 def save_image(img, path):
     """
     :param img: image array
     :param path: absolute path of the target file
-    :return:
+    :return: True if the image is saved
     """
     try:
-        image.save_img(path, img)
-        logger.info("Done :: Image saved {0}".format(path.rsplit(os.sep, 1)[1]))
+        write_image_file(img, path)
+        logger.debug("Done :: Image saved %s", path)
+        return True
     except FileNotFoundError:
-        os.mkdir(path.rsplit(os.sep, 1)[0])
-        image.save_img(path, img)
-        logger.info("Done :: Image saved {0}".format(path.rsplit(os.sep, 1)[1]))
+        os.makedirs(path.rsplit(os.sep, 1)[0], exist_ok=True)
+        write_image_file(img, path)
+        logger.debug("Done :: Image saved %s", path)
+        return True
     except Exception as e:
         logger.error("Failed to save the image in directory {0}".format(path))
         logger.error(str(e))
+        return False
 
 
 if __name__ == '__main__':
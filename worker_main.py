@@ -0,0 +1,53 @@
+"""
+Standalone worker of the sqlite job queue, started on any host which mounts the dataset storage and the queue file
+at the same paths as the task manager. The worker processes lease the job tickets of the shared queue and report
+back through it, the task manager collects the reports and tracks the tasks. The shared storage must support POSIX
+file locks, see SqliteJobQueue, and the queue must keep the default DELETE journal mode.
+
+usage: python worker_main.py [--queue_path destination/.job_queue.sqlite3] [--num_workers 4] [--max_idle_sec 600]
+"""
+from log_manager import get_logger, get_log_queue
+from config_manager import ConfigurationManager
+from job_queue import get_job_queue, run_worker
+import multiprocessing
+import argparse
+import os
+
+logger = get_logger()
+
+POOL_ONLY_OPTIONS = ('backend', 'num_workers', 'queue_size', 'queue_options')
+
+
+def main():
+    pool_config = dict(ConfigurationManager('dev').get_worker_pool_config() or {})
+    queue_options = dict((pool_config.get('queue_options') or {}).get('sqlite', {}))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queue_path', default=queue_options.get('path'), help="path of the shared sqlite queue")
+    parser.add_argument('--num_workers', type=int, default=pool_config.get('num_workers') or os.cpu_count() or 1)
+    parser.add_argument('--max_idle_sec', type=float, default=None,
+                        help="stop after this many seconds without a job ticket, run until stopped if not given")
+    args = parser.parse_args()
+
+    if args.queue_path:
+        queue_options['path'] = args.queue_path
+    job_queue = get_job_queue('sqlite', queue_size=pool_config.get('queue_size', 1000), **queue_options)
+    worker_options = {key: value for key, value in pool_config.items() if key not in POOL_ONLY_OPTIONS}
+    worker_options.update(log_queue=get_log_queue(), max_idle_sec=args.max_idle_sec)
+    workers = []
+    for _ in range(args.num_workers):
+        worker = multiprocessing.Process(target=run_worker, args=(job_queue,), kwargs=worker_options, daemon=True)
+        worker.start()
+        workers.append(worker)
+    logger.info("Started {0} workers on the job queue {1}".format(args.num_workers, job_queue.path))
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping the workers, their leased jobs are handed out again once the leases expire")
+        for worker in workers:
+            worker.terminate()
+    logger.info("Workers stopped")
+
+
+if __name__ == '__main__':
+    main()